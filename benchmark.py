@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Weirdhost 续期脚本性能基准 - 针对本地模拟面板运行 WeirdhostLogin.run()
+
+对 1、10、100 个模拟服务器分别统计单服务器耗时的 p50/p95 和总耗时，
+用于离线发现性能提升或退化。
+
+用法: python benchmark.py --servers 1,10,100 --latency 50 --jitter 20 --mode browser
+"""
+
+import os
+import sys
+import json
+import math
+import time
+import argparse
+import tempfile
+
+from mock_panel import MockPanel
+
+
+def percentile(values, pct):
+    """最近秩百分位数"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, math.ceil(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def run_case(count, args, workdir):
+    """启动模拟面板并对 count 个服务器运行一次续期"""
+    panel = MockPanel(latency=args.latency, jitter=args.jitter).start()
+    try:
+        server_ids = [f"bench{i:04d}" for i in range(count)]
+        os.environ.update({
+            'WEIRDHOST_URL': panel.url,
+            'WEIRDHOST_LOGIN_URL': f"{panel.url}/auth/login",
+            'WEIRDHOST_SERVER_URLS': ','.join(panel.server_url(server_id) for server_id in server_ids),
+            'REMEMBER_WEB_COOKIE': panel.cookie,
+            'WEIRDHOST_EMAIL': panel.email,
+            'WEIRDHOST_PASSWORD': panel.password,
+            'WEIRDHOST_CONCURRENCY': str(args.concurrency),
+            'WEIRDHOST_HTTP_RENEW': 'true' if args.mode == 'http' else 'false',
+            'WEIRDHOST_STATE_FILE': os.path.join(workdir, f"state-{count}.json"),
+            'WEIRDHOST_SESSION_CACHE': os.path.join(workdir, f"session-{count}.json"),
+            'WEIRDHOST_METRICS_FILE': os.path.join(workdir, f"metrics-{count}.json"),
+            'WEIRDHOST_HISTORY_FILE': os.path.join(workdir, f"history-{count}.jsonl"),
+            'WEIRDHOST_PROFILE_DIR': args.profile_dir or '',
+        })
+
+        # 环境变量在构造时读取，因此每个用例都新建实例
+        from main import WeirdhostLogin
+        login = WeirdhostLogin()
+        login.force = True
+
+        started = time.monotonic()
+        results = login.run()
+        wall = time.monotonic() - started
+
+        latencies = [login.metrics.server_total(server_id) for server_id in server_ids]
+        statuses = {}
+        for result in results:
+            statuses[result.status] = statuses.get(result.status, 0) + 1
+
+        startup = login.startup_metrics()
+        return {
+            'servers': count,
+            'wall': round(wall, 3),
+            'launch': startup['browser_launch'],
+            'first_nav': startup['first_navigation'],
+            'p50': round(percentile(latencies, 50), 3),
+            'p95': round(percentile(latencies, 95), 3),
+            'requests': panel.requests,
+            'statuses': statuses,
+        }
+    finally:
+        panel.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Weirdhost 续期脚本性能基准")
+    parser.add_argument('--servers', default='1,10,100', help="服务器数量，逗号分隔")
+    parser.add_argument('--latency', type=float, default=50.0, help="模拟面板每个请求的延迟（毫秒）")
+    parser.add_argument('--jitter', type=float, default=20.0, help="延迟抖动（毫秒）")
+    parser.add_argument('--concurrency', type=int, default=4, help="WEIRDHOST_CONCURRENCY")
+    parser.add_argument('--mode', choices=['browser', 'http'], default='browser', help="续期路径")
+    parser.add_argument('--profile-dir', help="使用持久化浏览器配置目录（比较冷启动与热启动）")
+    parser.add_argument('--output', help="将结果写入 JSON 文件")
+    parser.add_argument('--log-level', default='WARNING', help="续期脚本的日志级别（默认只输出警告，避免日志输出影响计时）")
+    args = parser.parse_args()
+    
+    from main import setup_logging
+    setup_logging(args.log_level)
+
+    counts = [int(count) for count in args.servers.split(',') if count.strip()]
+    rows = []
+    with tempfile.TemporaryDirectory() as workdir:
+        for count in counts:
+            print(f"▶️ 运行基准: {count} 个服务器 ({args.mode}, 并发 {args.concurrency})", file=sys.stderr)
+            rows.append(run_case(count, args, workdir))
+
+    print("=" * 60)
+    print(f"{'服务器数':>8} {'总耗时(s)':>10} {'启动(s)':>8} {'首次导航(s)':>10} {'p50(s)':>8} {'p95(s)':>8} {'请求数':>8}  结果")
+    for row in rows:
+        statuses = ', '.join(f"{status}={n}" for status, n in row['statuses'].items())
+        launch = row['launch'] if row['launch'] is not None else '-'
+        first_nav = row['first_nav'] if row['first_nav'] is not None else '-'
+        print(f"{row['servers']:>8} {row['wall']:>10} {launch:>8} {first_nav:>10} "
+              f"{row['p50']:>8} {row['p95']:>8} {row['requests']:>8}  {statuses}")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({'mode': args.mode, 'latency': args.latency, 'jitter': args.jitter,
+                       'concurrency': args.concurrency, 'profile_dir': args.profile_dir,
+                       'results': rows}, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -6,15 +6,899 @@ Weirdhost 登录脚本 - GitHub Actions 版本
 """
 
 import os
+import re
+import argparse
+import json
 import sys
 import time
-from datetime import datetime
-from playwright.sync_api import sync_playwright, TimeoutError
+import random
+import signal
+import heapq
+import base64
+import hashlib
+import queue
+import atexit
+import asyncio
+import logging
+import threading
+import contextvars
+import logging.handlers
+import http.client
+from collections import deque
+from contextlib import contextmanager, AsyncExitStack
+from dataclasses import dataclass, asdict, fields
+from datetime import datetime, timezone, timedelta
+from http.cookies import SimpleCookie
+from urllib.parse import urlparse, unquote, urljoin
 
+# 退出码：续期失败为 1，argparse 参数错误为 2，其余为各类配置错误
+EXIT_OK = 0
+EXIT_FAILED = 1
+EXIT_BAD_ACCOUNTS = 3
+EXIT_NO_AUTH = 4
+EXIT_NO_SERVERS = 5
+EXIT_BAD_URL = 6
+EXIT_BAD_VALUE = 7
 
-class WeirdhostLogin:
+# 数值型配置项，--check 时检查格式
+NUMERIC_SETTINGS = (
+    'WEIRDHOST_CONCURRENCY', 'WEIRDHOST_RESULT_TIMEOUT', 'WEIRDHOST_FALLBACK_WAIT',
+    'WEIRDHOST_SERVER_INTERVAL', 'WEIRDHOST_PAGE_TIMEOUT', 'WEIRDHOST_SERVER_BUDGET',
+    'WEIRDHOST_RUN_BUDGET', 'WEIRDHOST_MAX_RETRIES', 'WEIRDHOST_RETRY_BACKOFF',
+    'WEIRDHOST_RETRY_BACKOFF_MAX', 'WEIRDHOST_BUTTON_TIMEOUT', 'WEIRDHOST_RENEW_INTERVAL',
+    'WEIRDHOST_RENEW_WINDOW', 'WEIRDHOST_PANEL_TZ_OFFSET', 'WEIRDHOST_HTTP_TIMEOUT',
+    'WEIRDHOST_SESSION_TTL', 'WEIRDHOST_PROFILE_CACHE_MB', 'WEIRDHOST_DISCOVERY_TTL',
+    'WEIRDHOST_DAEMON_JITTER', 'WEIRDHOST_DAEMON_RETRY', 'WEIRDHOST_DAEMON_MAX_SLEEP',
+    'WEIRDHOST_DIAG_HAR_ENTRIES', 'WEIRDHOST_DIAG_MAX_MB', 'WEIRDHOST_DIAG_RETENTION_DAYS',
+    'WEIRDHOST_DIAG_TRACE_WINDOW',
+)
+
+# 多账号配置中必须是字符串的字段
+ACCOUNT_TEXT_FIELDS = ('name', 'cookie', 'email', 'password', 'discover')
+
+LOG_LEVELS = ('DEBUG', 'INFO', 'WARNING', 'ERROR')
+LOG_FORMATS = ('text', 'json')
+
+logger = logging.getLogger('weirdhost')
+
+# 当前正在处理的服务器ID；页面池和 HTTP 续期的每个任务有独立的上下文，并发输出的日志也能区分服务器
+log_server = contextvars.ContextVar('log_server', default='')
+
+
+def playwright_api():
+    """按需导入 Playwright：配置检查、HTTP 续期和合并结果都不需要浏览器"""
+    from playwright import async_api
+    return async_api
+
+
+def is_playwright_timeout(error):
+    """判断是否为 Playwright 的超时异常；按类型所在模块判断，不导入 Playwright，未安装时也可调用"""
+    return any(cls.__name__ == 'TimeoutError' and cls.__module__.startswith('playwright.')
+               for cls in type(error).__mro__)
+
+
+def env_float(name, default):
+    """读取数值型环境变量，未设置或格式错误时返回默认值"""
+    try:
+        return float(os.getenv(name, ''))
+    except ValueError:
+        return default
+
+
+def env_list(name, default=''):
+    """读取逗号分隔的环境变量，未设置或为空时使用默认值，'none' 表示空列表"""
+    value = os.getenv(name) or default
+    if value.strip().lower() == 'none':
+        return []
+    return [item.strip().lower() for item in value.split(',') if item.strip()]
+
+
+def domain_matches(host, domains):
+    """判断主机名是否属于列表中的某个域名（含子域名）"""
+    return any(host == domain or host.endswith('.' + domain) for domain in domains)
+
+
+def load_accounts():
+    """读取多账号配置（WEIRDHOST_ACCOUNTS 的 JSON 或 WEIRDHOST_ACCOUNTS_FILE 指向的文件），未配置时返回空列表
+
+    格式: [{"name": "a", "cookie": "...", "email": "...", "password": "...", "servers": ["https://..."]}]
+    """
+    raw = os.getenv('WEIRDHOST_ACCOUNTS', '')
+    accounts_file = os.getenv('WEIRDHOST_ACCOUNTS_FILE', '')
+    if not raw and accounts_file:
+        with open(accounts_file, 'r', encoding='utf-8') as f:
+            raw = f.read()
+    if not raw.strip():
+        return []
+    
+    accounts = json.loads(raw)
+    if not isinstance(accounts, list) or not all(isinstance(account, dict) for account in accounts):
+        raise ValueError("账号配置必须是对象列表")
+    for index, account in enumerate(accounts, 1):
+        # null 视为未设置，其他非字符串值直接报错，避免之后在拼接或解析时崩溃
+        for key in ACCOUNT_TEXT_FIELDS + ('servers',):
+            if account.get(key, '') is None:
+                del account[key]
+        for key in ACCOUNT_TEXT_FIELDS:
+            if not isinstance(account.get(key, ''), str):
+                raise ValueError(f"第 {index} 个账号的 {key} 必须是字符串")
+        servers = account.get('servers', [])
+        if not isinstance(servers, str) and not (isinstance(servers, list) and all(isinstance(url, str) for url in servers)):
+            raise ValueError(f"第 {index} 个账号的 servers 必须是字符串或字符串列表")
+    return accounts
+
+
+def path_for_account(path, account_name):
+    """为每个账号生成独立的缓存/指标文件路径"""
+    if not account_name:
+        return path
+    root, ext = os.path.splitext(path)
+    safe_name = re.sub(r'[^\w-]', '_', account_name)
+    return f"{root}-{safe_name}{ext}"
+
+
+def normalize_server_url(value, base_url):
+    """规范化服务器地址：可以只填服务器ID，去掉查询参数、锚点和末尾斜杠；无效时返回 None"""
+    value = value.strip()
+    if re.fullmatch(r'[\w-]+', value):
+        value = f"{base_url.rstrip('/')}/server/{value}"
+    parsed = urlparse(value)
+    path = parsed.path.rstrip('/')
+    if parsed.scheme not in ('http', 'https') or not parsed.netloc or not path:
+        return None
+    return f"{parsed.scheme.lower()}://{parsed.netloc.lower()}{path}"
+
+
+def server_id_from_url(server_url):
+    """从服务器URL中提取服务器ID（兼容末尾的斜杠）"""
+    return server_url.rstrip('/').split('/')[-1] if server_url else "unknown"
+
+
+def shard_of(server_id, count):
+    """按服务器ID的哈希确定所属分片，与运行环境和服务器顺序无关"""
+    digest = hashlib.sha1(server_id.encode('utf-8')).hexdigest()
+    return int(digest, 16) % count
+
+
+def parse_shard(value):
+    """解析 --shard i/n，i 从 0 开始"""
+    try:
+        index, count = (int(part) for part in value.split('/'))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"无效的分片 '{value}'，格式应为 i/n")
+    if count < 1 or not 0 <= index < count:
+        raise argparse.ArgumentTypeError(f"无效的分片 '{value}'，要求 0 <= i < n")
+    return index, count
+
+
+class LogContextFilter(logging.Filter):
+    """在调用方的任务中给日志记录补上账号和服务器字段（进入队列之前执行）"""
+    
+    def filter(self, record):
+        record.account = getattr(record, 'account', '')
+        record.server = getattr(record, 'server', '') or log_server.get()
+        return True
+
+
+class TextFormatter(logging.Formatter):
+    """文本格式: [时间] 级别: [账号] 消息"""
+    
+    def format(self, record):
+        prefix = f"[{record.account}] " if record.account else ""
+        return f"[{self.formatTime(record, '%Y-%m-%d %H:%M:%S')}] {record.levelname}: {prefix}{record.getMessage()}"
+
+
+class JsonFormatter(logging.Formatter):
+    """JSON lines 格式，每行一条日志，账号和服务器作为独立字段"""
+    
+    def format(self, record):
+        entry = {
+            'time': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+        }
+        if record.account:
+            entry['account'] = record.account
+        if record.server:
+            entry['server'] = record.server
+        entry['message'] = record.getMessage()
+        return json.dumps(entry, ensure_ascii=False)
+
+
+class BufferedStreamHandler(logging.StreamHandler):
+    """写入时不逐条 flush，由 LogListener 在队列取空后统一 flush"""
+    
+    def flush(self):
+        pass
+    
+    def flush_buffer(self):
+        super().flush()
+
+
+class LogListener(logging.handlers.QueueListener):
+    """后台线程写出日志；队列取空时才 flush，一批日志只产生一次系统调用"""
+    
+    def dequeue(self, block):
+        if block and self.queue.empty():
+            for handler in self.handlers:
+                handler.flush_buffer()
+        return super().dequeue(block)
+
+
+log_listener = None
+
+
+def setup_logging(level='INFO', fmt='text'):
+    """配置日志：按级别过滤，日志先进入队列，由后台线程格式化并批量写到标准输出"""
+    global log_listener
+    stop_logging()
+    
+    handler = BufferedStreamHandler(sys.stdout)
+    handler.setFormatter(JsonFormatter() if fmt == 'json' else TextFormatter())
+    log_queue = queue.SimpleQueue()
+    queue_handler = logging.handlers.QueueHandler(log_queue)
+    queue_handler.addFilter(LogContextFilter())
+    
+    logger.handlers[:] = [queue_handler]
+    logger.setLevel(level.upper())
+    logger.propagate = False
+    log_listener = LogListener(log_queue, handler)
+    log_listener.start()
+
+
+def stop_logging():
+    """写出队列中剩余的日志并停止后台线程"""
+    global log_listener
+    if log_listener:
+        log_listener.stop()
+        log_listener.handlers[0].flush_buffer()
+        log_listener = None
+
+
+def flush_logs():
+    """等待已排队的日志写出，用于在 print 输出汇总之前保持顺序"""
+    if log_listener:
+        log_listener.stop()
+        log_listener.handlers[0].flush_buffer()
+        log_listener.start()
+
+
+atexit.register(stop_logging)
+
+
+class HttpRenewer:
+    """不启动浏览器的 HTTP 续期客户端，所有服务器共享 keep-alive 连接池和 cookies"""
+    
+    USER_AGENT = ('Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 '
+                  '(KHTML, like Gecko) Chrome/120.0 Safari/537.36')
+    # 连接失效时可以安全重发的请求方法
+    IDEMPOTENT_METHODS = ('GET', 'HEAD', 'OPTIONS')
+    
+    def __init__(self, base_url, cookies, timeout=15.0):
+        parsed = urlparse(base_url)
+        self.scheme = parsed.scheme or 'https'
+        self.host = parsed.hostname
+        self.port = parsed.port
+        self.timeout = timeout
+        self.cookies = dict(cookies)
+        self.csrf_headers = {}
+        self.lock = threading.Lock()
+        self.pool = queue.LifoQueue()
+    
+    def connect(self):
+        """新建一个连接"""
+        if self.scheme == 'https':
+            return http.client.HTTPSConnection(self.host, self.port, timeout=self.timeout)
+        return http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+    
+    def close(self):
+        """关闭连接池中的所有连接"""
+        while True:
+            try:
+                self.pool.get_nowait().close()
+            except queue.Empty:
+                break
+    
+    def cookie_header(self):
+        with self.lock:
+            return '; '.join(f"{name}={value}" for name, value in self.cookies.items())
+    
+    def store_cookies(self, response):
+        """保存响应中的 Set-Cookie"""
+        for header in response.headers.get_all('Set-Cookie') or []:
+            jar = SimpleCookie()
+            try:
+                jar.load(header)
+            except Exception:
+                continue
+            with self.lock:
+                for name, morsel in jar.items():
+                    self.cookies[name] = morsel.value
+    
+    def request(self, method, path, body=None, headers=None):
+        """发送请求（不跟随重定向），返回 (状态码, Location, 响应文本)"""
+        try:
+            conn = self.pool.get_nowait()
+            reused = True
+        except queue.Empty:
+            conn = self.connect()
+            reused = False
+        
+        all_headers = {
+            'User-Agent': self.USER_AGENT,
+            'Accept': 'application/json, text/html;q=0.9',
+            'Cookie': self.cookie_header(),
+        }
+        all_headers.update(self.csrf_headers)
+        all_headers.update(headers or {})
+        
+        # 复用的连接可能已被服务器关闭，此时用新连接重试一次；
+        # 非幂等请求（续期 POST）一旦发出就不再重发，服务器可能已经处理过，重发会重复续期
+        while True:
+            sent = False
+            try:
+                conn.request(method, path, body=body, headers=all_headers)
+                sent = True
+                response = conn.getresponse()
+                data = response.read()
+                break
+            except (http.client.HTTPException, ConnectionError):
+                conn.close()
+                if not reused or (sent and method not in self.IDEMPOTENT_METHODS):
+                    raise
+                conn = self.connect()
+                reused = False
+        
+        self.store_cookies(response)
+        if response.will_close:
+            conn.close()
+        else:
+            self.pool.put(conn)
+        return response.status, response.getheader('Location', ''), data.decode('utf-8', 'replace')
+    
+    def prepare(self):
+        """访问首页验证 cookie 并获取 CSRF/XSRF 令牌，cookie 被拒绝时返回 False"""
+        status, location, body = self.request('GET', '/')
+        if 300 <= status < 400 and ("login" in location or "auth" in location):
+            return False
+        if status >= 400:
+            return False
+        
+        with self.lock:
+            xsrf = self.cookies.get('XSRF-TOKEN')
+        if xsrf:
+            self.csrf_headers = {'X-XSRF-TOKEN': unquote(xsrf)}
+        else:
+            match = re.search(r'<meta[^>]+name="(?:csrf-token|_token)"[^>]+content="([^"]+)"', body)
+            if match:
+                self.csrf_headers = {'X-CSRF-TOKEN': match.group(1)}
+        return True
+    
+    def renew(self, path):
+        """调用续期接口，返回 (状态码, 响应文本)"""
+        status, _, body = self.request('POST', path, body='{}', headers={
+            'Content-Type': 'application/json',
+            'X-Requested-With': 'XMLHttpRequest',
+        })
+        return status, body
+
+
+@dataclass
+class RenewOutcome:
+    """点击续期按钮后的判断结果"""
+    status: str
+    source: str = "none"       # response / toast / http_status / dom / none
+    evidence: str = ""         # 命中的提示文本或状态码
+    http_status: int = None
+
+
+@dataclass(slots=True)
+class ServerResult:
+    """单个服务器的处理结果；server_id 为空表示整次运行级别的错误（如无认证信息）"""
+    server_id: str
+    status: str
+    duration: float = None     # 处理耗时（秒），浏览器处理时包含重试
+    attempts: int = 0          # 浏览器处理次数，HTTP 续期或跳过时为 0
+    source: str = ""           # http / response / toast / http_status / dom
+    evidence: str = ""         # 命中的提示文本或状态码
+    
+    # 续期成功或已续期过都视为该服务器本次处理正常
+    OK_STATUSES = ("success", "already_renewed")
+    
+    def __str__(self):
+        if not self.server_id:
+            return f"error: {self.status}"
+        return f"{self.server_id}: {self.status}"
+    
+    @property
+    def failed(self):
+        """是否应让整次任务以失败退出"""
+        return not self.server_id or self.status in ("login_failed", "timeout", "budget_exceeded", "shard_missing")
+    
+    def to_dict(self):
+        return asdict(self)
+    
+    @classmethod
+    def from_dict(cls, data):
+        names = {field.name for field in fields(cls)}
+        return cls(**{key: value for key, value in data.items() if key in names})
+
+
+class RunHistory:
+    """追加写入的运行历史（JSONL，每行一次运行），并增量维护每个服务器的汇总统计"""
+    
+    # 每个服务器保留的最近结果数量
+    RECENT_SIZE = 10
+    
+    def __init__(self, path):
+        self.path = path
+        self.summary_path = os.path.splitext(path)[0] + '.summary.json'
+    
+    def runs(self):
+        """逐行读取历史记录，跳过损坏的行"""
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        yield json.loads(line)
+                    except ValueError:
+                        continue
+        except FileNotFoundError:
+            return
+    
+    def load_summary(self):
+        """读取汇总统计，不存在或损坏时从历史记录重建"""
+        try:
+            with open(self.summary_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            summary = {'runs': 0, 'servers': {}}
+            for run in self.runs():
+                self.apply(summary, run)
+            return summary
+    
+    def apply(self, summary, run):
+        """把一次运行的结果累加到汇总统计"""
+        summary['runs'] += 1
+        for data in run.get('results', []):
+            result = ServerResult.from_dict(data)
+            if not result.server_id or result.status == "skipped":
+                continue
+            entry = summary['servers'].setdefault(result.server_id, {
+                'runs': 0, 'ok': 0, 'renewed': 0, 'latency_total': 0.0, 'recent': [],
+            })
+            entry['runs'] += 1
+            if result.status in ServerResult.OK_STATUSES:
+                entry['ok'] += 1
+            if result.status == "success" and result.duration is not None:
+                entry['renewed'] += 1
+                entry['latency_total'] = round(entry['latency_total'] + result.duration, 3)
+            entry['recent'] = (entry['recent'] + [result.status])[-self.RECENT_SIZE:]
+            entry['last_run'] = run.get('run_at')
+    
+    def append(self, run):
+        """追加一次运行并更新汇总统计，返回更新后的汇总"""
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        summary = self.load_summary()
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(run, ensure_ascii=False) + '\n')
+        self.apply(summary, run)
+        tmp_path = f"{self.summary_path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(summary, f, ensure_ascii=False)
+        os.replace(tmp_path, self.summary_path)
+        return summary
+
+
+class FailureDiagnostics:
+    """失败诊断：每个页面最近的网络请求保存在环形缓冲区，Playwright 追踪按块录制，
+    只有服务器处理失败时才写入磁盘，诊断目录按保留天数和总大小清理
+
+    级别：off 不记录；failures 失败时写 HAR；trace 另外录制追踪；debug 另外输出按钮调试信息
+    """
+    
+    LEVELS = ('off', 'failures', 'trace', 'debug')
+    
+    # HAR 中不写出的敏感请求头
+    REDACTED_HEADERS = ('cookie', 'set-cookie', 'authorization', 'x-xsrf-token', 'x-csrf-token')
+    
+    def __init__(self, directory, level='failures', har_entries=200, max_bytes=50 * 1024 * 1024,
+                 retention=7 * 86400, trace_window=5):
+        self.directory = directory
+        self.level = level if level in self.LEVELS else 'failures'
+        self.har_entries = har_entries
+        self.max_bytes = max_bytes
+        self.retention = retention
+        self.trace_window = trace_window
+        self.buffers = {}
+        self.tracing = False
+        self.trace_lock = asyncio.Lock()
+        self.trace_successes = 0
+    
+    def enabled(self, level):
+        return self.LEVELS.index(self.level) >= self.LEVELS.index(level)
+    
+    def watch(self, page):
+        """为页面挂上网络请求的环形缓冲区"""
+        if not self.enabled('failures'):
+            return
+        buffer = self.buffers[page] = deque(maxlen=self.har_entries)
+        page.on('response', lambda response: buffer.append(self.har_entry(response.request, response)))
+        page.on('requestfailed', lambda request: buffer.append(self.har_entry(request, None, request.failure)))
+        page.on('close', lambda _: self.buffers.pop(page, None))
+    
+    def reset(self, page):
+        """开始处理新服务器前清空页面的缓冲区"""
+        if page in self.buffers:
+            self.buffers[page].clear()
+    
+    def har_headers(self, headers):
+        return [{'name': name, 'value': '[redacted]' if name.lower() in self.REDACTED_HEADERS else value}
+                for name, value in headers.items()]
+    
+    def har_entry(self, request, response, failure=None):
+        """生成一条精简的 HAR 1.2 条目（不含正文）"""
+        timing = request.timing or {}
+        entry = {
+            'startedDateTime': datetime.now(timezone.utc).isoformat(),
+            'time': max(0, timing.get('responseEnd', -1)),
+            'request': {
+                'method': request.method, 'url': request.url, 'httpVersion': '',
+                'headers': self.har_headers(request.headers), 'cookies': [], 'queryString': [],
+                'headersSize': -1, 'bodySize': -1,
+            },
+            'response': {
+                'status': response.status if response else 0,
+                'statusText': response.status_text if response else '',
+                'httpVersion': '', 'headers': self.har_headers(response.headers) if response else [],
+                'cookies': [], 'redirectURL': '', 'headersSize': -1, 'bodySize': -1,
+                'content': {'size': -1, 'mimeType': response.headers.get('content-type', '') if response else ''},
+            },
+            'cache': {},
+            'timings': {'send': 0, 'wait': max(0, timing.get('responseStart', -1)), 'receive': 0},
+            '_resourceType': request.resource_type,
+        }
+        if failure:
+            entry['_failure'] = failure
+        return entry
+    
+    async def attach(self, context):
+        """trace 级别下为上下文开启追踪，按块录制"""
+        if not self.enabled('trace'):
+            return
+        await context.tracing.start(screenshots=True, snapshots=True)
+        await context.tracing.start_chunk()
+        self.tracing = True
+    
+    async def discard(self, context):
+        """处理成功：连续成功 trace_window 个服务器后丢弃当前追踪块，限制追踪占用"""
+        if not self.tracing:
+            return
+        self.trace_successes += 1
+        if self.trace_successes < self.trace_window:
+            return
+        async with self.trace_lock:
+            self.trace_successes = 0
+            await context.tracing.stop_chunk()
+            await context.tracing.start_chunk()
+    
+    async def capture(self, page, server_id, status, attempt):
+        """处理失败：写出页面缓冲区中的 HAR 和当前追踪块，返回文件名前缀"""
+        if not self.enabled('failures'):
+            return None
+        os.makedirs(self.directory, exist_ok=True)
+        stamp = datetime.now(timezone.utc).strftime('%Y%m%d-%H%M%S')
+        safe_id = re.sub(r'[^\w-]', '_', server_id)
+        base = os.path.join(self.directory, f"{stamp}-{safe_id}-{status}-{attempt}")
+        
+        har = {'log': {
+            'version': '1.2',
+            'creator': {'name': 'weirdhost-renew', 'version': '1'},
+            'pages': [],
+            'entries': list(self.buffers.get(page, [])),
+        }}
+        with open(f"{base}.har", 'w', encoding='utf-8') as f:
+            json.dump(har, f, ensure_ascii=False)
+        
+        if self.tracing:
+            async with self.trace_lock:
+                self.trace_successes = 0
+                await page.context.tracing.stop_chunk(path=f"{base}.trace.zip")
+                await page.context.tracing.start_chunk()
+        
+        self.prune(keep=base)
+        return base
+    
+    def prune(self, keep=None):
+        """删除超过保留天数的文件，并从最旧的开始删除直到总大小不超过上限（保留以 keep 开头的文件）"""
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return
+        cutoff = time.time() - self.retention
+        files = []
+        for name in names:
+            path = os.path.join(self.directory, name)
+            try:
+                stat = os.stat(path)
+                if stat.st_mtime < cutoff:
+                    os.remove(path)
+                    continue
+            except OSError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, path))
+        
+        total = sum(size for _, size, _ in files)
+        for _, size, path in sorted(files):
+            if total <= self.max_bytes:
+                break
+            if keep and path.startswith(keep):
+                continue
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
+
+
+class RunMetrics:
+    """单次运行的分阶段耗时记录"""
+    
     def __init__(self):
-        """初始化，从环境变量读取配置"""
+        self.started_at = time.time()
+        self.spans = []
+        self.servers = {}
+    
+    @contextmanager
+    def span(self, name, server_id=None, **fields):
+        """记录一个阶段的耗时，yield 出的字典可在阶段内补充字段"""
+        record = {'name': name, **fields}
+        started = time.monotonic()
+        try:
+            yield record
+        finally:
+            record['duration'] = round(time.monotonic() - started, 3)
+            if server_id is None:
+                self.spans.append(record)
+            else:
+                self.servers.setdefault(server_id, []).append(record)
+    
+    def summary(self):
+        """按阶段名汇总次数、总耗时、平均耗时和最大耗时"""
+        phases = {}
+        for record in self.spans + [r for records in self.servers.values() for r in records]:
+            phase = phases.setdefault(record['name'], {'count': 0, 'total': 0.0, 'max': 0.0})
+            phase['count'] += 1
+            phase['total'] += record['duration']
+            phase['max'] = max(phase['max'], record['duration'])
+        for phase in phases.values():
+            phase['total'] = round(phase['total'], 3)
+            phase['mean'] = round(phase['total'] / phase['count'], 3)
+        return phases
+    
+    def server_total(self, server_id):
+        """服务器的总耗时（浏览器处理或 HTTP 续期）"""
+        return round(sum(r['duration'] for r in self.servers.get(server_id, [])
+                         if r['name'] in ('server', 'http_renew')), 3)
+
+
+class RenewState:
+    """本地续期状态：记录每个服务器上次成功续期时间和到期时间，用于跳过未到期的服务器"""
+    
+    def __init__(self, path):
+        self.path = path
+        self.servers = {}
+        # 各按钮查找策略的全局命中次数
+        self.strategy_hits = {}
+    
+    def load(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            self.servers = data.get('servers', {})
+            self.strategy_hits = data.get('strategy_hits', {})
+        except (OSError, ValueError):
+            self.servers = {}
+            self.strategy_hits = {}
+        return self
+    
+    def save(self):
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'servers': self.servers, 'strategy_hits': self.strategy_hits}, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.path)
+    
+    def preferred_strategy(self, server_id):
+        return self.servers.get(server_id, {}).get('button_strategy')
+    
+    def strategy_order(self, server_id, strategies, weak_strategies):
+        """按学习结果排序按钮查找策略：该服务器上次命中的策略、全局命中最多的策略、默认顺序
+
+        宽泛的策略不参与全局排序，只有在该服务器上命中过才会提前
+        """
+        strong = [name for name in strategies if name not in weak_strategies]
+        weak = [name for name in strategies if name in weak_strategies]
+        ranked = sorted(strong, key=lambda name: -self.strategy_hits.get(name, 0)) + weak
+        preferred = self.preferred_strategy(server_id)
+        if preferred in strategies:
+            ranked.remove(preferred)
+            ranked.insert(0, preferred)
+        return ranked
+    
+    def record_strategy(self, server_id, strategy):
+        self.servers.setdefault(server_id, {})['button_strategy'] = strategy
+        self.strategy_hits[strategy] = self.strategy_hits.get(strategy, 0) + 1
+    
+    def next_due(self, server_id, interval, window):
+        """服务器下次需要续期的时间戳：已知到期时间时为到期前 window 秒，否则为上次续期后 interval 秒"""
+        entry = self.servers.get(server_id)
+        if not entry:
+            return 0.0
+        expires_at = entry.get('expires_at')
+        if expires_at:
+            return expires_at - window
+        last_renewed = entry.get('last_renewed')
+        return last_renewed + interval if last_renewed else 0.0
+    
+    def is_due(self, server_id, now, interval, window):
+        """判断服务器是否需要续期"""
+        return self.next_due(server_id, interval, window) <= now
+    
+    def update_expiry(self, server_id, expires_at):
+        self.servers.setdefault(server_id, {})['expires_at'] = expires_at
+    
+    def record(self, server_id, status, now, expires_at=None):
+        entry = self.servers.setdefault(server_id, {})
+        entry['last_status'] = status
+        entry['last_checked'] = now
+        if status == "success" or (status == "already_renewed" and not entry.get('last_renewed')):
+            entry['last_renewed'] = now
+        if expires_at:
+            entry['expires_at'] = expires_at
+        elif status == "success":
+            # 续期后旧的到期时间已失效
+            entry.pop('expires_at', None)
+
+
+class WeirdhostLogin:
+    # 无头 CI 环境下的精简启动参数
+    LEAN_LAUNCH_ARGS = [
+        '--disable-gpu',
+        '--disable-dev-shm-usage',
+        '--disable-extensions',
+        '--disable-background-networking',
+        '--disable-component-update',
+        '--disable-default-apps',
+        '--disable-sync',
+        '--no-first-run',
+        '--no-default-browser-check',
+        '--mute-audio',
+        # 页面池中的后台页面不降速
+        '--disable-renderer-backgrounding',
+        '--disable-background-timer-throttling',
+        '--disable-backgrounding-occluded-windows',
+    ]
+    
+    # README 中的状态消息映射
+    STATUS_MESSAGES = {
+        "success": "✅ 续期成功",
+        "skipped": "⏭️ 未到续期时间，已跳过",
+        "already_renewed": "⚠️ 已经续期过了",
+        "no_button_found": "❌ 未找到续期按钮",
+        "button_disabled": "❌ 续期按钮不可点击",
+        "login_failed": "❌ 登录失败", 
+        "error": "💥 运行出错",
+        "click_error": "💥 点击按钮出错",
+        "unknown_changed": "⚠️ 页面变化但结果未知",
+        "no_change": "⚠️ 页面无变化",
+        "no_auth": "❌ 无认证信息",
+        "no_servers": "❌ 无服务器配置",
+        "timeout": "⏰ 操作超时",
+        "shard_missing": "💥 所属分片未产生结果",
+        "budget_exceeded": "⏰ 超出运行时间预算，未处理"
+    }
+    
+    # 可重试的临时性失败（导航超时、点击出错等）
+    RETRYABLE_STATUSES = ("timeout", "click_error", "error")
+    
+    # 需要保存诊断信息的结果
+    DIAGNOSED_STATUSES = ("no_button_found", "unknown_changed", "no_change", "error", "click_error", "timeout")
+    
+    # 登录后面板下发的 remember_web cookie 名称
+    REMEMBER_COOKIE_NAME = 'remember_web_59ba36addc2b2f9401580f014c7f58ea4e30989d'
+    
+    # 点击后出现的提示框/通知区域
+    TOAST_SELECTOR = '[role="alert"], .toast, .alert, .notification, .swal2-popup, .Toastify__toast'
+    
+    # 续期按钮查找策略（按默认优先级排列），在页面内一次性竞速执行
+    BUTTON_STRATEGIES = ['text:시간추가', 'text:시간 추가', 'text:시간', 'class:primary']
+    # 宽泛的策略容易误中其他按钮，页面渲染一段时间后仍找不到精确按钮才启用
+    WEAK_BUTTON_STRATEGIES = ['text:시간', 'class:primary']
+    BUTTON_MARKER = 'data-weirdhost-renew'
+    FIND_BUTTON_SCRIPT = r'''([order, weak, weakAfter, marker]) => {
+        const visible = el => el.offsetParent !== null || el.getClientRects().length > 0;
+        const buttons = Array.from(document.querySelectorAll('button')).filter(visible);
+        const finders = {
+            'text:시간추가': () => buttons.find(btn => btn.textContent.includes('시간추가')),
+            'text:시간 추가': () => buttons.find(btn => btn.textContent.includes('시간 추가')),
+            'text:시간': () => buttons.find(btn => btn.textContent.includes('시간')),
+            'class:primary': () => buttons.find(btn => btn.matches('.btn-primary, .btn-success')),
+        };
+        for (const name of order) {
+            if (weak.includes(name) && Date.now() < weakAfter) {
+                continue;
+            }
+            const button = finders[name] && finders[name]();
+            if (button) {
+                document.querySelectorAll(`[${marker}]`).forEach(el => el.removeAttribute(marker));
+                button.setAttribute(marker, '1');
+                return name;
+            }
+        }
+        return null;
+    }'''
+    
+    # 页面上的到期时间，例如 "유통기한 2025-01-01 12:00:00"
+    EXPIRY_SCRIPT = r'''() => {
+        const match = document.body.innerText.match(
+            /(?:유통기한|만료|expir\w*)\s*[:：]?\s*(\d{4}-\d{2}-\d{2}[ T]\d{2}:\d{2}(?::\d{2})?)/i
+        );
+        return match ? match[1] : null;
+    }'''
+    
+    # 续期结果提示文本（预编译，只在提示区域或接口响应中匹配）
+    ERROR_PATTERNS = ["already renewed", "can't renew", "only once", "이미", "한번", "불가능"]
+    # 成功提示按整词匹配（"unsuccessful" 不算），韩文排除后面跟否定语尾的情况（성공하지 못했습니다）
+    SUCCESS_PATTERNS = [r"\bsuccess(?:ful(?:ly)?)?\b", r"\bsucceeded\b", r"\badded\b",
+                        r"성공(?!\s*하지\s*(?:못|않))", r"추가됨", r"추가되었"]
+    # 成功提示前三个词内出现否定词时不算成功（"Time not added"）
+    NEGATION_RE = re.compile(r"\b(?:not|no|never|cannot)\b|n't\b", re.IGNORECASE)
+    # 出现失败提示时整条文本都不算成功
+    FAILURE_RE = re.compile(r"\b(?:fail(?:ed|ure|s)?|error|unsuccessful(?:ly)?)\b|실패|오류", re.IGNORECASE)
+    ERROR_RE = re.compile('|'.join(re.escape(pattern) for pattern in ERROR_PATTERNS), re.IGNORECASE)
+    SUCCESS_RE = re.compile('|'.join(SUCCESS_PATTERNS), re.IGNORECASE)
+    # JSON 响应中参与匹配的提示字段
+    MESSAGE_KEYS = ('message', 'detail', 'error', 'title')
+    
+    # 点击前安装的 MutationObserver：只收集提示区域的文本，并统计 DOM 变化次数
+    OBSERVER_SCRIPT = r'''(selector) => {
+        if (window.__weirdhostObserver) {
+            window.__weirdhostObserver.disconnect();
+        }
+        window.__weirdhostNotices = [];
+        window.__weirdhostMutations = 0;
+        const observer = new MutationObserver(records => {
+            for (const record of records) {
+                window.__weirdhostMutations++;
+                const nodes = record.type === 'characterData' ? [record.target] : Array.from(record.addedNodes);
+                for (const node of nodes) {
+                    const el = node.nodeType === 1 ? node : node.parentElement;
+                    if (!el) {
+                        continue;
+                    }
+                    const region = el.closest(selector) || el.querySelector(selector);
+                    const text = region && region.innerText.trim();
+                    if (text && !window.__weirdhostNotices.includes(text)) {
+                        window.__weirdhostNotices.push(text);
+                    }
+                }
+            }
+        });
+        observer.observe(document.body, {childList: true, subtree: true, characterData: true});
+        window.__weirdhostObserver = observer;
+    }'''
+    NOTICES_SCRIPT = "(seen) => window.__weirdhostNotices && window.__weirdhostNotices.length > seen && window.__weirdhostNotices"
+    COLLECT_SCRIPT = r'''() => {
+        if (window.__weirdhostObserver) {
+            window.__weirdhostObserver.disconnect();
+        }
+        return {notices: window.__weirdhostNotices || [], mutations: window.__weirdhostMutations || 0};
+    }'''
+    
+    def __init__(self, account=None):
+        """初始化，从环境变量读取配置；account 为多账号配置中的一项，覆盖认证信息和服务器列表"""
         self.url = os.getenv('WEIRDHOST_URL', 'https://hub.weirdhost.xyz')
         self.server_urls = os.getenv('WEIRDHOST_SERVER_URLS', 'https://hub.weirdhost.xyz/server/d54a8070/')
         self.login_url = os.getenv('WEIRDHOST_LOGIN_URL', 'https://hub.weirdhost.xyz/auth/login')
@@ -26,16 +910,318 @@ class WeirdhostLogin:
         
         # 浏览器配置
         self.headless = os.getenv('HEADLESS', 'true').lower() == 'true'
+        self.lean_launch = (os.getenv('WEIRDHOST_LEAN_LAUNCH') or 'true').lower() == 'true'
+        self.extra_launch_args = env_list('WEIRDHOST_LAUNCH_ARGS')
+        # 持久化浏览器配置目录（可选）：HTTP 缓存和 service worker 资源在多次运行间保留
+        self.profile_dir = os.getenv('WEIRDHOST_PROFILE_DIR', '')
+        self.profile_cache_size = int(env_float('WEIRDHOST_PROFILE_CACHE_MB', 50.0) * 1024 * 1024)
+        
+        # 并发配置：同一登录上下文中同时处理的服务器（页面）数量
+        try:
+            self.concurrency = max(1, int(os.getenv('WEIRDHOST_CONCURRENCY', '1')))
+        except ValueError:
+            self.concurrency = 1
+        
+        # 等待配置（秒）：点击后等待结果事件的期限、无事件时的兜底等待、服务器之间的间隔
+        self.result_timeout = env_float('WEIRDHOST_RESULT_TIMEOUT', 10.0)
+        self.fallback_wait = env_float('WEIRDHOST_FALLBACK_WAIT', 5.0)
+        self.server_interval = env_float('WEIRDHOST_SERVER_INTERVAL', 0.0)
+        
+        # 时间预算（秒）：页面操作默认超时、单个服务器（含重试）预算、整次运行预算（0 表示不限制）
+        self.page_timeout = env_float('WEIRDHOST_PAGE_TIMEOUT', 30.0)
+        self.server_budget = env_float('WEIRDHOST_SERVER_BUDGET', 120.0)
+        self.run_budget = env_float('WEIRDHOST_RUN_BUDGET', 1200.0)
+        self.run_deadline = None
+        
+        # 临时性失败的重试：最多重试次数、指数退避的初始间隔和上限（秒）
+        self.max_retries = max(0, int(env_float('WEIRDHOST_MAX_RETRIES', 2)))
+        self.retry_backoff = env_float('WEIRDHOST_RETRY_BACKOFF', 2.0)
+        self.retry_backoff_max = env_float('WEIRDHOST_RETRY_BACKOFF_MAX', 20.0)
+        
+        # 浏览器阶段已完成的服务器结果，出错时保留
+        self.browser_results = {}
+        
+        # 失败诊断：级别（off/failures/trace/debug）、目录、每个页面保留的请求数、目录大小上限和保留天数
+        self.diagnostics = FailureDiagnostics(
+            os.getenv('WEIRDHOST_DIAG_DIR') or 'diagnostics',
+            level=(os.getenv('WEIRDHOST_DIAGNOSTICS') or 'failures').lower(),
+            har_entries=int(env_float('WEIRDHOST_DIAG_HAR_ENTRIES', 200)),
+            max_bytes=int(env_float('WEIRDHOST_DIAG_MAX_MB', 50.0) * 1024 * 1024),
+            retention=env_float('WEIRDHOST_DIAG_RETENTION_DAYS', 7.0) * 86400,
+            trace_window=int(env_float('WEIRDHOST_DIAG_TRACE_WINDOW', 5)),
+        )
+        
+        # 每个服务器各阶段实际等待耗时，以及点击后的判断结果
+        self.wait_timings = {}
+        self.outcomes = {}
+        
+        # 运行指标：JSON 指标文件，以及是否在 README 中追加耗时汇总
+        self.metrics = RunMetrics()
+        self.first_navigation_done = False
+        self.metrics_file = os.getenv('WEIRDHOST_METRICS_FILE') or 'metrics.json'
+        self.readme_metrics = (os.getenv('WEIRDHOST_README_METRICS') or 'false').lower() == 'true'
+        
+        # 当前使用的会话缓存创建时间
+        self.session_created_at = None
+        
+        # 续期状态缓存：跳过尚未到期的服务器（--force 时全部处理），并记录按钮查找策略
+        self.state_file = os.getenv('WEIRDHOST_STATE_FILE') or '.cache/renew_state.json'
+        self.renew_state = RenewState(self.state_file)
+        
+        # 运行历史（JSONL），README 中的成功率和平均续期耗时由其汇总得到
+        self.history_file = os.getenv('WEIRDHOST_HISTORY_FILE') or '.cache/history.jsonl'
+        self.history = RunHistory(self.history_file)
+        self.history_summary = None
+        self.button_timeout = env_float('WEIRDHOST_BUTTON_TIMEOUT', 15.0)
+        self.renew_interval = env_float('WEIRDHOST_RENEW_INTERVAL', 20.0) * 3600
+        self.renew_window = env_float('WEIRDHOST_RENEW_WINDOW', 48.0) * 3600
+        
+        # 常驻模式（秒）：续期时间的随机抖动、失败后的重试间隔、最长休眠（到期前醒来检查会话）
+        self.daemon_jitter = env_float('WEIRDHOST_DAEMON_JITTER', 300.0)
+        self.daemon_retry = env_float('WEIRDHOST_DAEMON_RETRY', 1800.0)
+        self.daemon_max_sleep = env_float('WEIRDHOST_DAEMON_MAX_SLEEP', 3600.0)
+        self.panel_tz = timezone(timedelta(hours=env_float('WEIRDHOST_PANEL_TZ_OFFSET', 9.0)))
+        self.force = False
+        
+        # 从页面读取到的服务器到期时间（时间戳）
+        self.server_expiry = {}
+        
+        # 请求拦截：屏蔽图片、媒体、字体及第三方域名，使页面更快可点击
+        self.block_resources = env_list('WEIRDHOST_BLOCK_RESOURCES', 'image,media,font')
+        self.blocked_domains = env_list(
+            'WEIRDHOST_BLOCKED_DOMAINS',
+            'google-analytics.com,googletagmanager.com,doubleclick.net,cloudflareinsights.com,hotjar.com,clarity.ms'
+        )
+        # 设置允许列表后，只放行面板域名和列表中的域名
+        self.allowed_domains = env_list('WEIRDHOST_ALLOWED_DOMAINS', 'none')
+        self.route_stats = {'blocked': 0, 'blocked_by_reason': {}, 'loaded': 0, 'bytes_loaded': 0}
+        
+        # HTTP 快速续期配置：直接调用面板续期接口，无法判断结果的服务器再交给浏览器
+        self.http_renew = (os.getenv('WEIRDHOST_HTTP_RENEW') or 'true').lower() == 'true'
+        self.renew_path = os.getenv('WEIRDHOST_RENEW_PATH', '/api/client/notfreeservers/{server_id}/renew')
+        self.http_timeout = env_float('WEIRDHOST_HTTP_TIMEOUT', 15.0)
+        
+        # 登录会话缓存：保存登录后的 storage_state，下次运行直接复用
+        self.session_cache = os.getenv('WEIRDHOST_SESSION_CACHE') or '.cache/weirdhost_session.json'
+        self.session_ttl = env_float('WEIRDHOST_SESSION_TTL', 72.0) * 3600
+        self.session_key = os.getenv('WEIRDHOST_SESSION_KEY', '')
+        
+        # 登录探测：请求一个需要登录的轻量接口判断登录状态，结果在本次运行中缓存
+        self.probe_path = os.getenv('WEIRDHOST_PROBE_PATH') or '/api/client/account'
+        self.login_probe = None
+        
+        # 自动发现服务器：登录后通过客户端接口一次性获取账号的服务器列表，结果按 TTL 缓存
+        # off 不发现；merge 与配置列表合并；filter 只保留账号中仍存在的配置服务器；replace 只使用发现的服务器
+        self.discover_mode = (os.getenv('WEIRDHOST_DISCOVER') or 'off').lower()
+        self.discovery_path = os.getenv('WEIRDHOST_DISCOVERY_PATH') or '/api/client'
+        self.discovery_cache = os.getenv('WEIRDHOST_DISCOVERY_CACHE') or '.cache/servers.json'
+        self.discovery_ttl = env_float('WEIRDHOST_DISCOVERY_TTL', 6.0) * 3600
         
         # 解析服务器URL列表
+        self.set_servers(self.server_urls.split(','))
+        
+        # 多账号：每个账号有独立的认证信息、服务器列表和缓存文件
+        self.account_name = ''
+        if account:
+            self.apply_account(account)
+        
+        # 分片：(i, n) 表示只处理第 i 个分片；all_servers 为分片前的完整列表，合并结果时用于排序
+        self.shard = None
+        self.all_servers = list(self.server_list)
+        # 合并分片结果时使用的指标（为空时使用本次运行的指标）
+        self.merged_metrics = None
+    
+    def set_servers(self, servers):
+        """规范化服务器地址并按服务器ID去重，无效地址记录在 invalid_servers 中"""
         self.server_list = []
-        if self.server_urls:
-            self.server_list = [url.strip() for url in self.server_urls.split(',') if url.strip()]
+        self.invalid_servers = []
+        self.duplicate_servers = []
+        seen = set()
+        for value in servers:
+            if not value.strip():
+                continue
+            url = normalize_server_url(value, self.url)
+            if url is None:
+                self.invalid_servers.append(value.strip())
+            elif server_id_from_url(url) in seen:
+                self.duplicate_servers.append(value.strip())
+            else:
+                seen.add(server_id_from_url(url))
+                self.server_list.append(url)
+    
+    def apply_account(self, account):
+        """使用多账号配置中的一项覆盖认证信息、服务器列表和缓存文件路径"""
+        self.account_name = str(account.get('name') or account.get('email') or 'account')
+        self.remember_web_cookie = account.get('cookie', '')
+        self.email = account.get('email', '')
+        self.password = account.get('password', '')
+        self.discover_mode = str(account.get('discover') or self.discover_mode).lower()
+        
+        servers = account.get('servers', [])
+        if isinstance(servers, str):
+            servers = servers.split(',')
+        self.server_urls = ','.join(servers)
+        self.set_servers(servers)
+        
+        self.session_cache = path_for_account(self.session_cache, self.account_name)
+        self.discovery_cache = path_for_account(self.discovery_cache, self.account_name)
+        if self.profile_dir:
+            self.profile_dir = os.path.join(self.profile_dir, re.sub(r'[^\w-]', '_', self.account_name))
+        self.state_file = path_for_account(self.state_file, self.account_name)
+        self.renew_state = RenewState(self.state_file)
+        self.history_file = path_for_account(self.history_file, self.account_name)
+        self.history = RunHistory(self.history_file)
+        self.metrics_file = path_for_account(self.metrics_file, self.account_name)
+        self.diagnostics.directory = path_for_account(self.diagnostics.directory, self.account_name)
+    
+    def apply_shard(self, index, count):
+        """只保留属于第 index 个分片的服务器，缓存和指标文件按分片区分"""
+        self.shard = (index, count)
+        self.server_list = self.shard_servers(self.all_servers)
+        
+        suffix = f"shard{index}of{count}"
+        self.session_cache = path_for_account(self.session_cache, suffix)
+        self.state_file = path_for_account(self.state_file, suffix)
+        self.renew_state = RenewState(self.state_file)
+        self.history_file = path_for_account(self.history_file, suffix)
+        self.history = RunHistory(self.history_file)
+        self.metrics_file = path_for_account(self.metrics_file, suffix)
+        if self.profile_dir:
+            self.profile_dir = os.path.join(self.profile_dir, suffix)
+        self.log(f"分片 {index}/{count}: {len(self.server_list)}/{len(self.all_servers)} 个服务器")
+    
+    def shard_servers(self, servers):
+        """返回属于当前分片的服务器（未分片时返回全部）"""
+        if not self.shard:
+            return list(servers)
+        index, count = self.shard
+        return [url for url in servers if shard_of(server_id_from_url(url), count) == index]
+    
+    def has_servers(self):
+        """是否有需要处理的服务器；merge/replace 模式下列表可能要到运行时才能确定"""
+        return bool(self.server_list) or self.discover_mode in ('merge', 'replace')
+    
+    def load_discovered(self, allow_stale=False):
+        """读取服务器发现缓存，返回服务器ID列表；缓存不存在或已过期时返回 None（allow_stale 时仍返回过期缓存）"""
+        try:
+            with open(self.discovery_cache, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if urlparse(data.get('url', '')).netloc != urlparse(self.url).netloc:
+                return None
+            age = time.time() - data['fetched_at']
+            if not allow_stale and (age < 0 or age > self.discovery_ttl):
+                return None
+            return [str(server_id) for server_id in data['servers']]
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+    
+    def save_discovered(self, server_ids):
+        """写入服务器发现缓存"""
+        try:
+            os.makedirs(os.path.dirname(self.discovery_cache) or '.', exist_ok=True)
+            tmp_path = f"{self.discovery_cache}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({'url': self.url, 'fetched_at': time.time(), 'servers': server_ids}, f, indent=2)
+            os.replace(tmp_path, self.discovery_cache)
+        except OSError as e:
+            self.log(f"保存服务器发现缓存失败: {e}", "WARNING")
+    
+    def fetch_server_ids(self, cookies):
+        """通过客户端接口获取账号的服务器ID（同步，在线程中执行）；每页 100 个，通常只需一个请求"""
+        renewer = HttpRenewer(self.url, cookies, self.http_timeout)
+        try:
+            server_ids = []
+            page = 1
+            while True:
+                separator = '&' if '?' in self.discovery_path else '?'
+                status, location, body = renewer.request('GET', f"{self.discovery_path}{separator}per_page=100&page={page}", headers={
+                    'Accept': 'application/json',
+                    'X-Requested-With': 'XMLHttpRequest',
+                })
+                reason = f"HTTP {status}" + (f" -> {location}" if location else "")
+                if status in (401, 403) or (300 <= status < 400 and ("login" in location or "auth" in location)):
+                    # cookie 未通过验证，需要先登录
+                    raise PermissionError(reason)
+                if status != 200:
+                    raise ValueError(reason)
+                data = json.loads(body)
+                server_ids.extend(str(item['attributes']['identifier']) for item in data.get('data', []))
+                pagination = data.get('meta', {}).get('pagination', {})
+                if page >= pagination.get('total_pages', 1):
+                    return server_ids
+                page += 1
+        finally:
+            renewer.close()
+    
+    async def discover_servers(self, cookies, defer=False):
+        """按 discover_mode 用账号的服务器列表合并或过滤配置的服务器列表；发现失败时沿用配置的列表
+
+        defer 为 True 时，没有 cookie 或 cookie 未通过验证则不做回退，返回 False，由调用方在浏览器登录后重新发现
+        """
+        if self.discover_mode == 'off':
+            return True
+        
+        server_ids = self.load_discovered()
+        if server_ids is not None:
+            self.log(f"使用服务器发现缓存 ({len(server_ids)} 个服务器)")
+        elif not cookies:
+            if defer:
+                return False
+            self.log("没有可用于接口请求的 cookie，跳过自动发现", "WARNING")
+        else:
+            with self.metrics.span("discover_servers") as span:
+                try:
+                    server_ids = await asyncio.to_thread(self.fetch_server_ids, cookies)
+                    span['servers'] = len(server_ids)
+                except PermissionError as e:
+                    if defer:
+                        self.log(f"服务器列表接口未通过登录验证 ({e})，登录后再获取")
+                        return False
+                    self.log(f"自动发现服务器失败: {e}", "WARNING")
+                except Exception as e:
+                    self.log(f"自动发现服务器失败: {e}", "WARNING")
+            if server_ids is not None:
+                self.log(f"🔎 自动发现 {len(server_ids)} 个服务器")
+                self.save_discovered(server_ids)
+        
+        if server_ids is None:
+            server_ids = self.load_discovered(allow_stale=True)
+            if server_ids is None:
+                self.log("无法获取账号的服务器列表，使用配置的服务器列表", "WARNING")
+                return True
+            self.log("使用已过期的服务器发现缓存", "WARNING")
+        self.apply_discovered(server_ids)
+        return True
+    
+    def apply_discovered(self, server_ids):
+        """将发现的服务器ID与配置的服务器列表合并或过滤，再按分片筛选"""
+        discovered = [url for url in (normalize_server_url(server_id, self.url) for server_id in server_ids) if url]
+        known = {server_id_from_url(url) for url in discovered}
+        configured = {server_id_from_url(url) for url in self.all_servers}
+        
+        if self.discover_mode == 'replace':
+            servers = discovered
+        elif self.discover_mode == 'filter':
+            servers = [url for url in self.all_servers if server_id_from_url(url) in known]
+            for server_id in configured - known:
+                self.log(f"⚠️ 服务器 {server_id} 不在账号的服务器列表中，跳过", "WARNING")
+        else:
+            servers = self.all_servers + [url for url in discovered if server_id_from_url(url) not in configured]
+            for server_id in known - configured:
+                self.log(f"➕ 发现新服务器 {server_id}")
+        
+        self.all_servers = servers
+        self.server_list = self.shard_servers(servers)
     
     def log(self, message, level="INFO"):
-        """日志输出"""
-        timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-        print(f"[{timestamp}] {level}: {message}")
+        """日志输出：低于当前级别的日志直接丢弃，其余交给队列由后台线程写出"""
+        levelno = logging.getLevelName(level)
+        if logger.isEnabledFor(levelno):
+            logger.log(levelno, message, extra={'account': self.account_name})
+    
+    def log_enabled(self, level):
+        """该级别的日志是否会输出，用于跳过只为日志服务的额外操作"""
+        return logger.isEnabledFor(logging.getLevelName(level))
     
     def has_cookie_auth(self):
         """检查是否有 cookie 认证信息"""
@@ -45,6 +1231,175 @@ class WeirdhostLogin:
         """检查是否有邮箱密码认证信息"""
         return bool(self.email and self.password)
     
+    def session_fingerprint(self):
+        """认证配置的指纹，凭据变化时缓存自动失效"""
+        raw = '\n'.join([self.url, self.remember_web_cookie, self.email, self.password])
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()[:16]
+    
+    def session_cipher(self):
+        """返回会话缓存的加密器；未设置密钥返回 None，缺少 cryptography 返回 False"""
+        if not self.session_key:
+            return None
+        try:
+            from cryptography.fernet import Fernet
+        except ImportError:
+            self.log("已设置 WEIRDHOST_SESSION_KEY 但未安装 cryptography，不使用会话缓存", "WARNING")
+            return False
+        key = base64.urlsafe_b64encode(hashlib.sha256(self.session_key.encode('utf-8')).digest())
+        return Fernet(key)
+    
+    def plaintext_session_allowed(self):
+        """是否允许写入未加密的会话缓存
+
+        CI 中 .cache 会进入 Actions 缓存，公开仓库的 fork PR 工作流也能恢复基础分支的缓存，
+        因此 CI 中只有设置了 WEIRDHOST_SESSION_KEY 才保存会话
+        """
+        return (os.getenv('CI') or '').lower() != 'true'
+    
+    def load_session_state(self):
+        """读取缓存的登录会话，缓存不存在、过期、凭据变化或无法解密时返回 None"""
+        if self.session_ttl <= 0 or not os.path.exists(self.session_cache):
+            return None
+        
+        cipher = self.session_cipher()
+        if cipher is False:
+            return None
+        
+        try:
+            with open(self.session_cache, 'r', encoding='utf-8') as f:
+                envelope = json.load(f)
+            
+            if envelope.get('fingerprint') != self.session_fingerprint():
+                self.log("认证配置已变化，会话缓存失效")
+                self.invalidate_session_state()
+                return None
+            
+            age = time.time() - envelope.get('created_at', 0)
+            if age > self.session_ttl:
+                self.log(f"会话缓存已过期 ({age / 3600:.1f} 小时)")
+                self.invalidate_session_state()
+                return None
+            
+            if envelope.get('encrypted'):
+                if not cipher:
+                    self.log("会话缓存已加密但未设置 WEIRDHOST_SESSION_KEY", "WARNING")
+                    return None
+                state = json.loads(cipher.decrypt(envelope['state'].encode('ascii')))
+            else:
+                state = envelope['state']
+            
+            self.session_created_at = envelope['created_at']
+            self.log(f"已加载会话缓存 ({age / 3600:.1f} 小时前创建)")
+            return state
+            
+        except Exception as e:
+            self.log(f"读取会话缓存失败: {e}", "WARNING")
+            self.invalidate_session_state()
+            return None
+    
+    async def save_session_state(self, context, created_at=None):
+        """将当前上下文的 storage_state 写入会话缓存"""
+        if self.session_ttl <= 0:
+            return
+        
+        cipher = self.session_cipher()
+        if cipher is False:
+            return
+        if cipher is None and not self.plaintext_session_allowed():
+            self.log("CI 环境中未设置 WEIRDHOST_SESSION_KEY，不保存明文会话缓存", "WARNING")
+            return
+        
+        try:
+            state = await context.storage_state()
+            envelope = {
+                'created_at': created_at or time.time(),
+                'fingerprint': self.session_fingerprint(),
+                'encrypted': bool(cipher),
+                'state': cipher.encrypt(json.dumps(state).encode('utf-8')).decode('ascii') if cipher else state,
+            }
+            
+            os.makedirs(os.path.dirname(self.session_cache) or '.', exist_ok=True)
+            fd = os.open(self.session_cache, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(envelope, f)
+            self.session_created_at = envelope['created_at']
+            self.log("💾 会话缓存已保存")
+            
+        except Exception as e:
+            self.log(f"保存会话缓存失败: {e}", "WARNING")
+    
+    def invalidate_session_state(self):
+        """删除会话缓存"""
+        self.session_created_at = None
+        try:
+            os.remove(self.session_cache)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            self.log(f"删除会话缓存失败: {e}", "WARNING")
+    
+    def session_cookies(self, state):
+        """从 storage_state 中取出属于面板域名的 cookies"""
+        host = urlparse(self.url).hostname
+        cookies = {}
+        for cookie in (state or {}).get('cookies', []):
+            if cookie.get('domain', '').lstrip('.') == host:
+                cookies[cookie['name']] = cookie['value']
+        return cookies
+    
+    def block_reason(self, url, resource_type):
+        """返回请求被拦截的原因，放行时返回 None"""
+        if resource_type in self.block_resources:
+            return resource_type
+        host = (urlparse(url).hostname or '').lower()
+        if not host:
+            return None
+        if domain_matches(host, self.blocked_domains):
+            return "denylist"
+        if self.allowed_domains and not domain_matches(host, self.allowed_domains + [urlparse(self.url).hostname]):
+            return "third_party"
+        return None
+    
+    async def route_handler(self, route):
+        """拦截重资源请求"""
+        request = route.request
+        reason = self.block_reason(request.url, request.resource_type)
+        if reason:
+            self.route_stats['blocked'] += 1
+            by_reason = self.route_stats['blocked_by_reason']
+            by_reason[reason] = by_reason.get(reason, 0) + 1
+            await route.abort("blockedbyclient")
+        else:
+            await route.continue_()
+    
+    def on_response(self, response):
+        """统计实际加载的请求数和字节数"""
+        self.route_stats['loaded'] += 1
+        try:
+            self.route_stats['bytes_loaded'] += int(response.headers.get('content-length', 0))
+        except ValueError:
+            pass
+    
+    async def install_route_filter(self, context):
+        """在上下文上安装请求拦截"""
+        context.on("response", self.on_response)
+        if self.profile_dir:
+            # Playwright 启用路由后会禁用 HTTP 缓存，持久化配置目录就失去了意义；
+            # 此时只用 profile_block_args 的启动参数屏蔽图片和屏蔽域名，字体/媒体和允许列表不再生效
+            self.log("使用持久化配置目录，不安装请求拦截以保留 HTTP 缓存")
+            return
+        if self.block_resources or self.blocked_domains or self.allowed_domains:
+            await context.route("**/*", self.route_handler)
+            self.log(f"已启用请求拦截: 类型={self.block_resources}, 屏蔽域名={len(self.blocked_domains)} 个, "
+                     f"允许列表={self.allowed_domains or '未设置'}")
+    
+    def log_route_stats(self):
+        """输出本次运行的拦截统计"""
+        stats = self.route_stats
+        detail = ', '.join(f"{reason}: {count}" for reason, count in stats['blocked_by_reason'].items())
+        self.log(f"🚫 已拦截 {stats['blocked']} 个请求 ({detail or '无'})，"
+                 f"实际加载 {stats['loaded']} 个请求 / {stats['bytes_loaded'] / 1024:.1f} KB")
+    
     def check_login_status(self, page):
         """检查是否已登录"""
         try:
@@ -62,24 +1417,68 @@ class WeirdhostLogin:
             self.log(f"检查登录状态时出错: {e}", "ERROR")
             return False
     
-    def login_with_cookies(self, context):
+    async def probe_login(self, context, refresh=False):
+        """通过上下文共享的 APIRequestContext 请求需要登录的接口判断登录状态，不渲染页面
+
+        返回 True/False，无法判断时返回 None；结果在本次运行中缓存，refresh 为 True 时重新探测
+        """
+        if self.login_probe is not None and not refresh:
+            return self.login_probe
+        
+        url = urljoin(self.url + '/', self.probe_path.lstrip('/'))
+        with self.metrics.span("login_probe") as span:
+            try:
+                response = await context.request.get(url, max_redirects=0, timeout=self.http_timeout * 1000, headers={
+                    'Accept': 'application/json',
+                    'X-Requested-With': 'XMLHttpRequest',
+                })
+            except Exception as e:
+                self.log(f"登录探测请求失败: {e}", "WARNING")
+                return None
+            status = response.status
+            location = response.headers.get('location', '')
+            span['http_status'] = status
+        
+        if 200 <= status < 300:
+            logged_in = True
+        elif status in (401, 403, 419) or (300 <= status < 400 and ("login" in location or "auth" in location)):
+            logged_in = False
+        else:
+            self.log(f"登录探测返回无法判断的状态 (HTTP {status})", "WARNING")
+            return None
+        
+        self.log(f"登录探测: {'已登录' if logged_in else '未登录'} (HTTP {status})")
+        self.login_probe = logged_in
+        return logged_in
+    
+    async def verify_login(self, context, page):
+        """确认上下文已登录：优先使用登录探测，无法判断时才加载首页检查"""
+        logged_in = await self.probe_login(context, refresh=True)
+        if logged_in is None:
+            await self.goto(page, self.url)
+            logged_in = self.check_login_status(page)
+            self.login_probe = logged_in
+        return logged_in
+    
+    async def login_with_cookies(self, context):
         """使用 Cookies 登录"""
         try:
             self.log("尝试使用 Cookies 登录...")
             
-            # 创建cookie
+            # 创建cookie（域名取自面板地址）
+            parsed = urlparse(self.url)
             session_cookie = {
-                'name': 'remember_web_59ba36addc2b2f9401580f014c7f58ea4e30989d',
+                'name': self.REMEMBER_COOKIE_NAME,
                 'value': self.remember_web_cookie,
-                'domain': 'hub.weirdhost.xyz',
+                'domain': parsed.hostname,
                 'path': '/',
                 'expires': int(time.time()) + 3600 * 24 * 365,
                 'httpOnly': True,
-                'secure': True,
+                'secure': parsed.scheme == 'https',
                 'sameSite': 'Lax'
             }
             
-            context.add_cookies([session_cookie])
+            await context.add_cookies([session_cookie])
             self.log("已添加 remember_web cookie")
             return True
                 
@@ -87,14 +1486,14 @@ class WeirdhostLogin:
             self.log(f"设置 Cookies 时出错: {e}", "ERROR")
             return False
     
-    def login_with_email(self, page):
+    async def login_with_email(self, page):
         """使用邮箱密码登录"""
         try:
             self.log("尝试使用邮箱密码登录...")
             
             # 访问登录页面
             self.log(f"访问登录页面: {self.login_url}")
-            page.goto(self.login_url, wait_until="domcontentloaded")
+            await self.goto(page, self.login_url)
             
             # 使用固定选择器
             email_selector = 'input[name="username"]'
@@ -103,19 +1502,19 @@ class WeirdhostLogin:
             
             # 等待元素加载
             self.log("等待登录表单元素加载...")
-            page.wait_for_selector(email_selector)
-            page.wait_for_selector(password_selector)
-            page.wait_for_selector(login_button_selector)
+            await page.wait_for_selector(email_selector)
+            await page.wait_for_selector(password_selector)
+            await page.wait_for_selector(login_button_selector)
             
             # 填写登录信息
             self.log("填写邮箱和密码...")
-            page.fill(email_selector, self.email)
-            page.fill(password_selector, self.password)
+            await page.fill(email_selector, self.email)
+            await page.fill(password_selector, self.password)
             
             # 点击登录并等待导航
             self.log("点击登录按钮...")
-            with page.expect_navigation(wait_until="domcontentloaded", timeout=90000):
-                page.click(login_button_selector)
+            async with page.expect_navigation(wait_until="domcontentloaded", timeout=self.page_timeout * 1000):
+                await page.click(login_button_selector)
             
             # 检查登录是否成功
             if "login" in page.url or "auth" in page.url:
@@ -129,184 +1528,229 @@ class WeirdhostLogin:
             self.log(f"邮箱密码登录时出错: {e}", "ERROR")
             return False
     
-    def add_server_time(self, page, server_url):
-        """添加服务器时间（续期）"""
+    async def add_server_time(self, page, server_id):
+        """添加服务器时间（续期），页面需已由 process_server 导航到服务器页面"""
         try:
-            server_id = server_url.split('/')[-1]
-            self.log(f"开始处理服务器 {server_id}")
-            
-            # 访问服务器页面 - 使用更严格的等待条件
-            self.log(f"访问服务器页面: {server_url}")
-            page.goto(server_url, wait_until="networkidle")
-            
-            # 多重等待策略确保页面完全加载
-            self.wait_for_page_ready(page, server_id)
-            
-            # 使用更可靠的查找方法
-            button = self.find_renew_button(page, server_id)
+            # 不单独等待页面就绪：查找按钮的 wait_for_function 会一直等到按钮渲染出来
+            with self.metrics.span("find_renew_button", server_id) as span:
+                button = await self.find_renew_button(page, server_id)
+                span['strategy'] = self.renew_state.preferred_strategy(server_id) if button else None
             
             if not button:
-                return f"{server_id}: no_button_found"
+                return "no_button_found"
             
             # 点击按钮并处理结果
-            return self.click_and_check_result(page, button, server_id)
+            with self.metrics.span("click_and_check_result", server_id) as span:
+                result = await self.click_and_check_result(page, button, server_id)
+                outcome = self.outcomes.get(server_id)
+                span['source'] = outcome.source if outcome else None
+            return result
                 
         except Exception as e:
             self.log(f"❌ 服务器 {server_id} 处理过程中出错: {e}")
-            return f"{server_id}: error"
-
-    def wait_for_page_ready(self, page, server_id):
-        """等待页面完全就绪"""
-        # 等待主要内容区域加载
-        try:
-            page.wait_for_selector('.server-details, .server-info, .card, .panel', timeout=10000)
-            self.log(f"✅ 服务器 {server_id} 主要内容已加载")
-        except:
-            self.log(f"⚠️ 服务器 {server_id} 未找到主要内容区域")
-        
-        # 等待所有图片加载完成
-        try:
-            page.wait_for_load_state('networkidle', timeout=15000)
-            self.log(f"✅ 服务器 {server_id} 网络空闲")
-        except:
-            self.log(f"⚠️ 服务器 {server_id} 网络未完全空闲")
-        
-        # 额外等待时间确保动态内容加载
-        time.sleep(3)
-
-    def find_renew_button(self, page, server_id):
-        """查找续期按钮 - 使用多种方法"""
-        selectors = [
-            'button:has-text("시간추가")',
-            'button:has-text("시간 추가")',
-            '//button[contains(text(), "시간추가")]',
-            '//button[contains(text(), "시간 추가")]',
-        ]
+            return "error"
+
+    def record_wait(self, server_id, name, started):
+        """记录一次等待的实际耗时"""
+        elapsed = round(time.monotonic() - started, 3)
+        self.wait_timings.setdefault(server_id, {})[name] = elapsed
+        self.log(f"⏱️ 服务器 {server_id} {name} 等待耗时 {elapsed:.3f}s", "DEBUG")
+        return elapsed
+
+    async def find_renew_button(self, page, server_id):
+        """查找续期按钮 - 所有策略在页面内一次执行，优先使用上次命中的策略"""
+        order = self.renew_state.strategy_order(server_id, self.BUTTON_STRATEGIES, self.WEAK_BUTTON_STRATEGIES)
         
-        for selector in selectors:
-            try:
-                if selector.startswith('//'):
-                    button = page.locator(f'xpath={selector}')
-                else:
-                    button = page.locator(selector)
-                
-                # 使用更严格的可见性检查
-                button.wait_for(state='visible', timeout=10000)
-                
-                if button.is_visible():
-                    self.log(f"✅ 服务器 {server_id} 找到按钮: {selector}")
-                    return button
-                    
-            except Exception as e:
-                continue
+        # 该服务器上次就是用宽泛策略找到的按钮时立即启用，否则先给精确策略留出渲染时间
+        weak = [name for name in self.WEAK_BUTTON_STRATEGIES if name != self.renew_state.preferred_strategy(server_id)]
+        weak_after = int((time.time() + self.button_timeout / 3) * 1000)
         
-        # 如果上述方法都失败，尝试更广泛的搜索
-        return self.find_button_alternative_methods(page, server_id)
-
-    def find_button_alternative_methods(self, page, server_id):
-        """备用的按钮查找方法"""
-        # 方法1: 查找所有按钮并筛选
         try:
-            all_buttons = page.locator('button')
-            button_count = all_buttons.count()
-            
-            for i in range(button_count):
-                try:
-                    button = all_buttons.nth(i)
-                    if button.is_visible():
-                        text = button.text_content().strip()
-                        if "시간" in text:
-                            self.log(f"✅ 服务器 {server_id} 通过文本搜索找到按钮: '{text}'")
-                            return button
-                except:
-                    continue
-        except:
-            pass
+            # wait_for_function 在页面内轮询，常见情况下只需一次往返
+            handle = await page.wait_for_function(
+                self.FIND_BUTTON_SCRIPT,
+                arg=[order, weak, weak_after, self.BUTTON_MARKER],
+                timeout=self.button_timeout * 1000,
+            )
+            strategy = await handle.json_value()
+        except Exception as e:
+            self.log(f"❌ 服务器 {server_id} 所有方法都未找到按钮: {e}")
+            return None
         
-        # 方法2: 查找特定class的按钮
-        try:
-            primary_buttons = page.locator('button.btn-primary, button.btn-success')
-            if primary_buttons.count() > 0:
-                button = primary_buttons.first
-                if button.is_visible():
-                    self.log(f"✅ 服务器 {server_id} 通过class找到主要按钮")
-                    return button
-        except:
-            pass
+        self.renew_state.record_strategy(server_id, strategy)
+        self.log(f"✅ 服务器 {server_id} 找到按钮: {strategy}", "DEBUG")
+        return page.locator(f'[{self.BUTTON_MARKER}]').first
+
+    def is_renew_response(self, response):
+        """判断响应是否来自续期接口"""
+        return response.request.method != "GET" and "renew" in response.url.lower()
+
+    @classmethod
+    def json_messages(cls, data):
+        """取出 JSON 响应中 message/detail 等提示字段的文本，字段名和其他字段不参与匹配"""
+        if isinstance(data, list):
+            return [text for item in data for text in cls.json_messages(item)]
+        if not isinstance(data, dict):
+            return []
+        texts = []
+        for key, value in data.items():
+            if key in cls.MESSAGE_KEYS and isinstance(value, str):
+                texts.append(value)
+            elif isinstance(value, (dict, list)):
+                texts.extend(cls.json_messages(value))
+        return texts
+
+    def match_result(self, text, http_status=None):
+        """根据提示文本或接口响应判断续期结果，返回 (状态, 命中的文本)，无法判断时返回 (None, None)
+
+        JSON 响应只匹配提示字段的值，布尔型 "success" 字段作为直接证据；
+        已知 HTTP 状态码时，只有 2xx 才可能判断为 success
+        """
+        flag = None
+        if text.lstrip().startswith(('{', '[')):
+            try:
+                data = json.loads(text)
+            except ValueError:
+                pass
+            else:
+                text = ' '.join(self.json_messages(data))
+                if isinstance(data, dict) and isinstance(data.get('success'), bool):
+                    flag = data['success']
+        match = self.ERROR_RE.search(text)
+        if match:
+            return "already_renewed", match.group(0)
+        if flag is False or (http_status is not None and not 200 <= http_status < 300):
+            return None, None
+        if self.FAILURE_RE.search(text):
+            return None, None
+        negated = False
+        for match in self.SUCCESS_RE.finditer(text):
+            preceding = ' '.join(text[:match.start()].split()[-3:])
+            if not self.NEGATION_RE.search(preceding):
+                return "success", match.group(0)
+            negated = True
+        if flag and not negated:
+            return "success", '"success": true'
+        return None, None
+
+    def match_result_text(self, text, http_status=None):
+        """根据提示文本判断续期结果，无法判断时返回 None"""
+        return self.match_result(text, http_status)[0]
+
+    async def wait_for_renew_outcome(self, page, button, server_id):
+        """点击按钮，等待续期接口响应或提示区域出现文本，超过期限才退回固定等待"""
+        outcome = RenewOutcome("no_change")
+        deadline = time.monotonic() + self.result_timeout
+        timeout_ms = self.result_timeout * 1000
+        response_text = ""
+        
+        # 只观察点击之后提示区域的变化
+        await page.evaluate(self.OBSERVER_SCRIPT, self.TOAST_SELECTOR)
+        
+        response_task = asyncio.ensure_future(
+            page.wait_for_event("response", predicate=self.is_renew_response, timeout=timeout_ms)
+        )
+        notice_task = asyncio.ensure_future(page.wait_for_function(self.NOTICES_SCRIPT, arg=0, timeout=timeout_ms))
+        tasks = {response_task, notice_task}
+        notice_seen = False
         
-        # 方法3: 执行JavaScript查找
         try:
-            button = page.evaluate_handle('''() => {
-                const buttons = Array.from(document.querySelectorAll('button'));
-                return buttons.find(btn => 
-                    btn.offsetParent !== null && 
-                    btn.textContent.includes('시간')
-                );
-            }''')
+            await button.click()
             
-            if button:
-                self.log(f"✅ 服务器 {server_id} 通过JavaScript找到按钮")
-                return button
-        except:
-            pass
+            pending = set(tasks)
+            while pending:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                done, pending = await asyncio.wait(pending, timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+                
+                if response_task in done and not response_task.exception():
+                    response = response_task.result()
+                    outcome.http_status = response.status
+                    try:
+                        response_text = await response.text()
+                    except Exception:
+                        pass
+                    status, evidence = self.match_result(response_text, response.status)
+                    if status:
+                        outcome.status, outcome.source, outcome.evidence = status, "response", evidence
+                        break
+                
+                if notice_task in done and not notice_task.exception():
+                    notice_seen = True
+                    notices = await notice_task.result().json_value()
+                    status, evidence = self.match_result(' '.join(notices), outcome.http_status)
+                    if status:
+                        outcome.status, outcome.source, outcome.evidence = status, "toast", evidence
+                        break
+                    # 提示文本无法判断结果：继续等待续期接口响应和后续提示
+                    remaining_ms = max(1, (deadline - time.monotonic()) * 1000)
+                    notice_task = asyncio.ensure_future(
+                        page.wait_for_function(self.NOTICES_SCRIPT, arg=len(notices), timeout=remaining_ms)
+                    )
+                    tasks.add(notice_task)
+                    pending.add(notice_task)
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
         
-        self.log(f"❌ 服务器 {server_id} 所有方法都未找到按钮")
-        return None
+        if outcome.source == "none" and outcome.http_status is None and not notice_seen:
+            self.log(f"⚠️ 服务器 {server_id} 未捕获到续期响应或提示框，退回固定等待 {self.fallback_wait}s")
+            await asyncio.sleep(self.fallback_wait)
+        
+        # 一次往返取回提示区域文本和 DOM 变化次数
+        collected = await page.evaluate(self.COLLECT_SCRIPT)
+        if outcome.source != "none":
+            return outcome
+        
+        status, evidence = self.match_result(' '.join(collected['notices']), outcome.http_status)
+        if status:
+            outcome.status, outcome.source, outcome.evidence = status, "toast", evidence
+        elif outcome.http_status is not None or collected['notices'] or collected['mutations']:
+            if collected['notices']:
+                evidence = collected['notices'][0]
+            elif outcome.http_status is not None:
+                evidence = f"HTTP {outcome.http_status}"
+            else:
+                evidence = f"{collected['mutations']} mutations"
+            outcome.status, outcome.source, outcome.evidence = "unknown_changed", "dom", evidence[:200]
+        return outcome
 
-    def click_and_check_result(self, page, button, server_id):
+    async def click_and_check_result(self, page, button, server_id):
         """点击按钮并检查结果"""
         try:
-            if button.is_enabled():
-                # 点击前保存页面状态用于比较
-                before_click = page.content()
-                
+            if await button.is_enabled():
                 self.log(f"✅ 服务器 {server_id} 按钮可点击，正在点击...")
-                button.click()
-                
-                # 等待页面响应
-                time.sleep(5)
-                
-                # 检查页面变化
-                after_click = page.content()
-                
-                # 检查是否出现错误消息
-                error_patterns = [
-                    "already renewed", "can't renew", "only once", 
-                    "이미", "한번", "불가능"
-                ]
+                started = time.monotonic()
                 
-                has_error = any(pattern in after_click.lower() for pattern in error_patterns)
+                # 等待续期接口响应或提示区域变化，而不是固定等待后比较整个页面
+                outcome = await self.wait_for_renew_outcome(page, button, server_id)
+                self.record_wait(server_id, "result", started)
+                self.wait_timings[server_id]["result_source"] = outcome.source
+                self.outcomes[server_id] = outcome
                 
-                if has_error:
-                    self.log(f"ℹ️ 服务器 {server_id} 检测到重复续期提示")
-                    return f"{server_id}: already_renewed"
+                if outcome.status == "already_renewed":
+                    self.log(f"ℹ️ 服务器 {server_id} 检测到重复续期提示: '{outcome.evidence}' ({outcome.source})")
+                elif outcome.status == "success":
+                    self.log(f"✅ 服务器 {server_id} 续期成功: '{outcome.evidence}' ({outcome.source})")
+                elif outcome.status == "unknown_changed":
+                    self.log(f"⚠️ 服务器 {server_id} 页面已变化但无明确结果: '{outcome.evidence}'")
                 else:
-                    # 检查是否有成功消息
-                    success_patterns = ["success", "성공", "added", "추가됨"]
-                    has_success = any(pattern in after_click.lower() for pattern in success_patterns)
-                    
-                    if has_success:
-                        self.log(f"✅ 服务器 {server_id} 续期成功")
-                        return f"{server_id}: success"
-                    else:
-                        # 检查页面内容是否发生变化
-                        if before_click != after_click:
-                            self.log(f"⚠️ 服务器 {server_id} 页面已变化但无明确结果")
-                            return f"{server_id}: unknown_changed"
-                        else:
-                            self.log(f"⚠️ 服务器 {server_id} 页面无变化")
-                            return f"{server_id}: no_change"
+                    self.log(f"⚠️ 服务器 {server_id} 页面无变化")
+                return outcome.status
             else:
                 self.log(f"❌ 服务器 {server_id} 按钮不可点击")
-                return f"{server_id}: button_disabled"
+                return "button_disabled"
                 
         except Exception as e:
             self.log(f"❌ 服务器 {server_id} 点击按钮时出错: {e}")
-            return f"{server_id}: click_error"
+            return "click_error"
 
-    def debug_element_visibility(self, page, server_id):
+    async def debug_element_visibility(self, page, server_id):
         """调试元素可见性"""
-        self.log(f"🔍 调试服务器 {server_id} 的元素可见性")
+        self.log(f"🔍 调试服务器 {server_id} 的元素可见性", "DEBUG")
         
         # 检查按钮的各种状态
         selectors = ['button:has-text("시간추가")', 'button:has-text("시간 추가")']
@@ -314,47 +1758,304 @@ class WeirdhostLogin:
         for selector in selectors:
             try:
                 element = page.locator(selector)
-                count = element.count()
-                visible = element.is_visible() if count > 0 else False
-                enabled = element.is_enabled() if count > 0 else False
+                count = await element.count()
+                visible = await element.first.is_visible() if count > 0 else False
+                enabled = await element.first.is_enabled() if count > 0 else False
                 
-                self.log(f"选择器 '{selector}': count={count}, visible={visible}, enabled={enabled}")
+                self.log(f"选择器 '{selector}': count={count}, visible={visible}, enabled={enabled}", "DEBUG")
                 
                 if count > 0:
-                    text = element.first.text_content().strip()
-                    self.log(f"  文本内容: '{text}'")
+                    text = (await element.first.text_content()).strip()
+                    self.log(f"  文本内容: '{text}'", "DEBUG")
                     
             except Exception as e:
-                self.log(f"选择器 '{selector}' 检查失败: {e}")
+                self.log(f"选择器 '{selector}' 检查失败: {e}", "DEBUG")
                     
-    def process_server(self, page, server_url):
-        """处理单个服务器的续期操作"""
-        server_id = server_url.split('/')[-1] if server_url else "unknown"
+    async def read_expiry(self, page, server_id):
+        """从页面读取服务器到期时间，读取失败时返回 None"""
+        try:
+            text = await page.evaluate(self.EXPIRY_SCRIPT)
+            if not text:
+                return None
+            expires = datetime.fromisoformat(text.replace(' ', 'T')).replace(tzinfo=self.panel_tz)
+            self.server_expiry[server_id] = expires.timestamp()
+            self.log(f"📅 服务器 {server_id} 到期时间: {text}")
+            return self.server_expiry[server_id]
+        except Exception as e:
+            self.log(f"⚠️ 服务器 {server_id} 读取到期时间失败: {e}")
+            return None
+
+    async def process_server(self, page, server_url):
+        """处理单个服务器的续期操作，返回结果状态"""
+        server_id = server_id_from_url(server_url)
         self.log(f"开始处理服务器 {server_id}")
         
         try:
-            # 访问服务器页面
-            self.log(f"访问服务器页面: {server_url}")
-            page.goto(server_url, wait_until="networkidle")
+            # 其他服务器已确认会话失效时不再导航
+            if self.login_probe is False:
+                return "login_failed"
             
-            # 添加详细的调试信息
-            self.debug_element_visibility(page, server_id)
+            # 访问服务器页面 - 整个流程只导航这一次
+            self.log(f"访问服务器页面: {server_url}", "DEBUG")
+            await self.goto(page, server_url, server_id)
             
-            # 检查是否已登录
+            # 只有落在登录页面时才重新探测登录状态
             if not self.check_login_status(page):
-                self.log(f"服务器 {server_id} 未登录，尝试重新登录", "WARNING")
-                return f"{server_id}: login_failed"
+                if not await self.probe_login(page.context, refresh=True):
+                    self.log(f"服务器 {server_id} 会话已失效", "WARNING")
+                    self.login_probe = False
+                    return "login_failed"
+                # 会话仍有效，视为偶发跳转，重新导航一次
+                self.log(f"服务器 {server_id} 被跳转到登录页面，但会话仍有效，重新访问", "WARNING")
+                await self.goto(page, server_url, server_id)
+                if not self.check_login_status(page):
+                    return "login_failed"
             
-            # 执行续期操作
-            result = self.add_server_time(page, server_url)
-            return result  # 直接返回结果，不要再次添加 server_id
+            # 详细的按钮调试信息只在 DEBUG 日志级别下收集和输出
+            if self.log_enabled("DEBUG"):
+                await self.debug_element_visibility(page, server_id)
+            
+            # 在同一次页面加载上执行续期操作：查找按钮、点击、判断结果
+            result = await self.add_server_time(page, server_id)
+            
+            # 续期成功时页面上仍是续期前的到期时间，不记录，由 RenewState.record 清除旧值；
+            # 其他结果下页面上的到期时间仍然有效，供下次运行判断是否需要续期
+            if result == "success":
+                self.server_expiry.pop(server_id, None)
+            else:
+                await self.read_expiry(page, server_id)
+            return result
             
         except Exception as e:
+            if is_playwright_timeout(e):
+                self.log(f"处理服务器 {server_id} 时超时: {e}", "ERROR")
+                return "timeout"
             self.log(f"处理服务器 {server_id} 时出错: {e}", "ERROR")
-            return f"{server_id}: error"
+            return "error"
+    
+    async def record_diagnostics(self, page, server_id, status, attempt):
+        """失败时写出诊断信息，成功时丢弃；诊断出错不影响续期结果"""
+        try:
+            if status in self.DIAGNOSED_STATUSES:
+                base = await self.diagnostics.capture(page, server_id, status, attempt)
+                if base:
+                    self.log(f"🧾 服务器 {server_id} 诊断信息已保存: {base}.*")
+            else:
+                await self.diagnostics.discard(page.context)
+        except Exception as e:
+            self.log(f"保存服务器 {server_id} 诊断信息失败: {e}", "WARNING")
+    
+    def budget_left(self, deadline=None):
+        """距离最近期限（单服务器期限与整次运行期限）的剩余秒数，都未设置时返回 None"""
+        deadlines = [d for d in (deadline, self.run_deadline) if d is not None]
+        if not deadlines:
+            return None
+        return min(deadlines) - time.monotonic()
+    
+    def retry_delay(self, attempt):
+        """第 attempt 次重试前的等待时间：带抖动的指数退避"""
+        delay = min(self.retry_backoff_max, self.retry_backoff * 2 ** attempt)
+        return delay * random.uniform(0.5, 1.0)
+    
+    async def process_server_with_retries(self, context, page, server_url):
+        """在时间预算内处理单个服务器，临时性失败时换新页面重试
+
+        返回 (ServerResult, 页面)，重试时旧页面会被关闭，调用方应归还返回的新页面
+        """
+        server_id = server_id_from_url(server_url)
+        log_server.set(server_id)
+        started = time.monotonic()
+        deadline = started + self.server_budget if self.server_budget > 0 else None
+        result = ServerResult(server_id, "budget_exceeded")
+        
+        for attempt in range(self.max_retries + 1):
+            budget = self.budget_left(deadline)
+            if budget is not None and budget <= 0:
+                self.log(f"⏰ 服务器 {server_id} 时间预算已用完，不再处理", "WARNING")
+                break
+            
+            self.diagnostics.reset(page)
+            try:
+                status = await asyncio.wait_for(self.process_server(page, server_url), budget)
+            except asyncio.TimeoutError:
+                self.log(f"⏰ 服务器 {server_id} 超出时间预算 ({budget:.1f}s)", "WARNING")
+                status = "timeout"
+            await self.record_diagnostics(page, server_id, status, attempt + 1)
+            
+            outcome = self.outcomes.get(server_id)
+            result = ServerResult(
+                server_id, status,
+                duration=round(time.monotonic() - started, 3),
+                attempts=attempt + 1,
+                source=outcome.source if outcome else "",
+                evidence=outcome.evidence if outcome else "",
+            )
+            if status not in self.RETRYABLE_STATUSES or attempt >= self.max_retries:
+                break
+            
+            delay = self.retry_delay(attempt)
+            remaining = self.budget_left(deadline)
+            if remaining is not None and remaining <= delay:
+                break
+            
+            self.log(f"🔁 服务器 {server_id} 结果为 {status}，{delay:.1f}s 后使用新页面重试 "
+                     f"({attempt + 1}/{self.max_retries})", "WARNING")
+            with self.metrics.span("retry_backoff", server_id, attempt=attempt + 1, status=status):
+                await asyncio.sleep(delay)
+            page = await self.replace_page(context, page)
+        
+        return result, page
+    
+    async def close_page(self, page):
+        try:
+            await page.close()
+        except Exception as e:
+            self.log(f"关闭页面失败: {e}", "WARNING")
+    
+    async def replace_page(self, context, page):
+        """关闭可能处于异常状态的页面，换成同一上下文中的新页面"""
+        await self.close_page(page)
+        return await self.create_page(context)
+    
+    async def create_page(self, context):
+        """创建并配置一个新页面"""
+        page = await context.new_page()
+        page.set_default_timeout(self.page_timeout * 1000)
+        self.diagnostics.watch(page)
+        return page
+    
+    async def process_servers(self, context, first_page, server_urls):
+        """使用页面池并发处理服务器，结果按输入顺序返回"""
+        pool_size = min(self.concurrency, len(server_urls))
+        self.log(f"页面池大小: {pool_size}")
+        
+        # 页面池：复用已登录的第一个页面，其余页面共享同一个上下文
+        pool = asyncio.Queue()
+        pool.put_nowait(first_page)
+        for _ in range(pool_size - 1):
+            pool.put_nowait(await self.create_page(context))
+        
+        async def worker(server_url):
+            server_id = server_id_from_url(server_url)
+            page = await pool.get()
+            try:
+                with self.metrics.span("server", server_id):
+                    try:
+                        result, page = await self.process_server_with_retries(context, page, server_url)
+                    except Exception as e:
+                        # 单个服务器的异常不影响其他服务器的结果
+                        self.log(f"❌ 服务器 {server_id} 处理失败: {e}", "ERROR")
+                        result = ServerResult(server_id, "error")
+                self.browser_results[server_url] = result
+                self.log(f"服务器处理结果: {result}")
+                
+                # 同一页面处理下一个服务器前的可选间隔（默认不等待）
+                if self.server_interval > 0:
+                    await asyncio.sleep(self.server_interval)
+                return result
+            finally:
+                pool.put_nowait(page)
+        
+        try:
+            # gather 保证结果顺序与 server_urls 一致
+            return list(await asyncio.gather(*(worker(url) for url in server_urls)))
+        finally:
+            # 关闭池中额外创建的页面，第一个页面由调用方管理
+            while not pool.empty():
+                page = pool.get_nowait()
+                if page is not first_page:
+                    await self.close_page(page)
     
+    def classify_http_response(self, status, body):
+        """判断续期接口的响应，无法判断时返回 None 交给浏览器处理
+
+        2xx 响应也必须在正文中有明确的成功或重复续期证据，否则同样交给浏览器确认
+        """
+        result = self.match_result_text(body, status)
+        if 200 <= status < 300:
+            return result
+        if status in (400, 409, 422, 429) and result == "already_renewed":
+            return result
+        return None
+
+    async def renew_via_http(self, server_urls, cookies):
+        """HTTP 快速路径：返回与 server_urls 对应的 ServerResult，无法判断的为 None"""
+        self.log("尝试使用 HTTP 快速续期...")
+        renewer = HttpRenewer(self.url, cookies, self.http_timeout)
+        
+        try:
+            with self.metrics.span("http_prepare"):
+                prepared = await asyncio.to_thread(renewer.prepare)
+            if not prepared:
+                self.log("HTTP 快速续期: cookie 未通过验证，改用浏览器", "WARNING")
+                return [None] * len(server_urls)
+            
+            semaphore = asyncio.Semaphore(self.concurrency)
+            
+            async def renew_one(server_url):
+                server_id = server_id_from_url(server_url)
+                log_server.set(server_id)
+                path = self.renew_path.format(server_id=server_id)
+                async with semaphore:
+                    try:
+                        with self.metrics.span("http_renew", server_id) as span:
+                            status, body = await asyncio.to_thread(renewer.renew, path)
+                            span['http_status'] = status
+                        duration = span['duration']
+                    except Exception as e:
+                        self.log(f"⚠️ 服务器 {server_id} HTTP 续期请求出错: {e}")
+                        return None
+                
+                result = self.classify_http_response(status, body)
+                if result is None:
+                    self.log(f"⚠️ 服务器 {server_id} HTTP 续期响应未知 (HTTP {status})，改用浏览器")
+                    return None
+                self.log(f"✅ 服务器 {server_id} HTTP 续期结果: {result} (HTTP {status})")
+                return ServerResult(server_id, result, duration=duration, source="http", evidence=f"HTTP {status}")
+            
+            return list(await asyncio.gather(*(renew_one(url) for url in server_urls)))
+        
+        except Exception as e:
+            self.log(f"HTTP 快速续期出错，改用浏览器: {e}", "WARNING")
+            return [None] * len(server_urls)
+        finally:
+            renewer.close()
+
     def run(self):
         """主运行函数"""
+        return asyncio.run(self.run_async())
+    
+    async def run_async(self, browser_provider=None):
+        """主运行函数（异步版本），记录整次运行的耗时指标
+
+        browser_provider 为返回共享浏览器的协程函数（多账号时使用），为空时自行启动浏览器
+        """
+        self.metrics = RunMetrics()
+        self.first_navigation_done = False
+        self.login_probe = None
+        self.run_deadline = time.monotonic() + self.run_budget if self.run_budget > 0 else None
+        with self.metrics.span("run"):
+            results = await self.renew_all(browser_provider)
+        self.write_metrics(results)
+        self.append_history(results)
+        return results
+    
+    def append_history(self, results):
+        """把本次运行追加到运行历史，并保存更新后的汇总统计供 README 使用"""
+        run_span = next((r for r in self.metrics.spans if r['name'] == 'run'), {})
+        run = {
+            'run_at': datetime.fromtimestamp(self.metrics.started_at, timezone.utc).isoformat(),
+            'account': self.account_name or None,
+            'duration': run_span.get('duration'),
+            'results': [result.to_dict() for result in results],
+        }
+        try:
+            self.history_summary = self.history.append(run)
+        except OSError as e:
+            self.log(f"写入运行历史失败: {e}", "WARNING")
+    
+    async def renew_all(self, browser_provider=None):
+        """检查配置并续期所有服务器"""
         self.log("开始 Weirdhost 自动续期任务")
         
         # 检查认证信息
@@ -366,134 +2067,562 @@ class WeirdhostLogin:
         
         if not has_cookie and not has_email:
             self.log("没有可用的认证信息！", "ERROR")
-            return ["error: no_auth"]
+            return [ServerResult("", "no_auth")]
+        
+        # 读取上次运行保存的登录会话，会话和 remember cookie 同时用于自动发现和 HTTP 快速路径
+        session_state = self.load_session_state()
+        http_cookies = self.session_cookies(session_state)
+        if has_cookie:
+            http_cookies[self.REMEMBER_COOKIE_NAME] = self.remember_web_cookie
+        state = self.renew_state.load()
+        if not await self.discover_servers(http_cookies, defer=True):
+            # 没有可用的 cookie 或 cookie 已失效：HTTP 快速路径也无法使用，浏览器登录后再获取服务器列表
+            self.log("自动发现需要登录，浏览器登录后再获取服务器列表")
+            results = await self.run_browser(None, has_cookie, has_email, session_state, browser_provider)
+            self.update_renew_state(state, results)
+            return results
         
         # 检查服务器URL列表
         if not self.server_list:
             self.log("未设置服务器URL列表！请设置 WEIRDHOST_SERVER_URLS 环境变量", "ERROR")
-            return ["error: no_servers"]
+            return [ServerResult("", "no_servers")]
         
+        results = self.skip_not_due(state)
+        if all(result is not None for result in results):
+            self.log("✅ 所有服务器都未到续期时间，无需处理")
+            return results
+        
+        # 优先走 HTTP 快速路径，只有结果未知的服务器才需要启动浏览器
+        if self.http_renew and http_cookies:
+            targets = [i for i, result in enumerate(results) if result is None]
+            http_results = await self.renew_via_http([self.server_list[i] for i in targets], http_cookies)
+            for i, result in zip(targets, http_results):
+                results[i] = result
+        
+        pending = [i for i, result in enumerate(results) if result is None]
+        if not pending:
+            self.log("✅ 所有服务器已通过 HTTP 处理，无需启动浏览器")
+        else:
+            self.log(f"使用浏览器处理 {len(pending)} 个服务器")
+            browser_results = await self.run_browser(
+                [self.server_list[i] for i in pending], has_cookie, has_email, session_state, browser_provider
+            )
+            for i, result in zip(pending, browser_results):
+                results[i] = result
+        
+        self.update_renew_state(state, results)
+        return results
+    
+    def skip_not_due(self, state):
+        """列出需要处理的服务器，返回与 server_list 对应的结果列表：未到续期时间的为 skipped，其余为 None"""
         self.log(f"需要处理的服务器数量: {len(self.server_list)}")
         for i, server_url in enumerate(self.server_list, 1):
             self.log(f"服务器 {i}: {server_url}")
         
-        results = []
+        now = time.time()
+        results = [None] * len(self.server_list)
+        for i, server_url in enumerate(self.server_list):
+            server_id = server_id_from_url(server_url)
+            if not self.force and not state.is_due(server_id, now, self.renew_interval, self.renew_window):
+                self.log(f"⏭️ 服务器 {server_id} 未到续期时间，跳过")
+                results[i] = ServerResult(server_id, "skipped")
+        return results
+    
+    def update_renew_state(self, state, results):
+        """将本次结果写入续期状态缓存"""
+        now = time.time()
+        for result in results:
+            if result.server_id and result.status != "skipped":
+                state.record(result.server_id, result.status, now, self.server_expiry.get(result.server_id))
         
         try:
-            with sync_playwright() as p:
-                # 启动浏览器
-                browser = p.chromium.launch(headless=self.headless)
-                
-                # 创建浏览器上下文
-                context = browser.new_context()
-                
-                # 创建页面
-                page = context.new_page()
-                page.set_default_timeout(90000)
-                
-                login_success = False
-                
-                # 方案1: 尝试 Cookie 登录
-                if has_cookie:
-                    if self.login_with_cookies(context):
-                        # 访问任意页面检查登录状态
-                        self.log("检查Cookie登录状态...")
-                        page.goto(self.url, wait_until="domcontentloaded")
-                        
-                        if self.check_login_status(page):
-                            self.log("✅ Cookie 登录成功！")
-                            login_success = True
-                        else:
-                            self.log("Cookie 登录失败，cookies 可能已过期", "WARNING")
-                
-                # 方案2: 如果 Cookie 登录失败，尝试邮箱密码登录
-                if not login_success and has_email:
-                    if self.login_with_email(page):
-                        # 登录成功后访问首页
-                        self.log("检查邮箱密码登录状态...")
-                        page.goto(self.url, wait_until="domcontentloaded")
-                        
-                        if self.check_login_status(page):
-                            self.log("✅ 邮箱密码登录成功！")
-                            login_success = True
-                
-                # 如果登录成功，依次处理每个服务器
-                if login_success:
-                    for server_url in self.server_list:
-                        result = self.process_server(page, server_url)
-                        results.append(result)
-                        self.log(f"服务器处理结果: {result}")
-                        
-                        # 在处理下一个服务器前等待一下
-                        time.sleep(5)
+            state.save()
+        except OSError as e:
+            self.log(f"保存续期状态失败: {e}", "WARNING")
+    
+    def launch_args(self):
+        """浏览器启动参数"""
+        args = list(self.LEAN_LAUNCH_ARGS) if self.lean_launch and self.headless else []
+        return args + [arg for arg in self.extra_launch_args if arg not in args]
+    
+    async def launch_browser(self, playwright):
+        """启动浏览器"""
+        with self.metrics.span("browser_launch", persistent=False):
+            return await playwright.chromium.launch(headless=self.headless, args=self.launch_args())
+    
+    def profile_block_args(self):
+        """持久化配置目录下代替请求拦截的启动参数：不加载图片，屏蔽域名解析失败"""
+        args = []
+        if 'image' in self.block_resources:
+            args.append('--blink-settings=imagesEnabled=false')
+        if self.blocked_domains:
+            rules = ', '.join(f"MAP {domain} ~NOTFOUND, MAP *.{domain} ~NOTFOUND" for domain in self.blocked_domains)
+            args.append(f'--host-resolver-rules={rules}')
+        return args
+    
+    async def clear_profile_cookies(self, context):
+        """清除持久化配置目录中的 cookies"""
+        try:
+            await context.clear_cookies()
+            self.log("已清除持久化配置目录中的 cookies")
+        except Exception as e:
+            self.log(f"清除持久化配置目录中的 cookies 失败: {e}", "WARNING")
+    
+    async def launch_persistent_context(self, playwright):
+        """使用持久化配置目录启动浏览器，返回其唯一的上下文"""
+        os.makedirs(self.profile_dir, exist_ok=True)
+        args = self.launch_args() + self.profile_block_args() + [f'--disk-cache-size={self.profile_cache_size}']
+        with self.metrics.span("browser_launch", persistent=True):
+            return await playwright.chromium.launch_persistent_context(
+                self.profile_dir, headless=self.headless, args=args
+            )
+    
+    async def goto(self, page, url, server_id=None, wait_until="domcontentloaded"):
+        """页面导航并记录耗时，本次运行的第一次导航额外记录为 first_navigation"""
+        first = not self.first_navigation_done
+        self.first_navigation_done = True
+        with self.metrics.span("goto", server_id, url=url, first=first):
+            return await page.goto(url, wait_until=wait_until)
+    
+    async def run_browser(self, server_urls, has_cookie, has_email, session_state=None, browser_provider=None):
+        """在整次运行的时间预算内用浏览器处理指定服务器，出错时保留已完成的结果
+
+        server_urls 为 None 时在登录后自动发现服务器列表，再处理其中需要续期的服务器
+        """
+        self.browser_results = {}
+        try:
+            return await asyncio.wait_for(
+                self.launch_and_run(server_urls, has_cookie, has_email, session_state, browser_provider),
+                self.budget_left(),
+            )
+        except asyncio.TimeoutError:
+            self.log("⏰ 本次运行时间预算已用完", "ERROR")
+            return self.partial_results(server_urls, "budget_exceeded")
+        except ImportError as e:
+            # 未安装 Playwright：HTTP 续期的结果和 README 仍然保留，需要浏览器的服务器标记为失败
+            self.log(f"无法加载 Playwright，需要浏览器的服务器无法处理: {e}", "ERROR")
+            return self.partial_results(server_urls, "error")
+        except Exception as e:
+            if is_playwright_timeout(e):
+                self.log(f"操作超时: {e}", "ERROR")
+                return self.partial_results(server_urls, "timeout")
+            self.log(f"运行时出错: {e}", "ERROR")
+            return self.partial_results(server_urls, "error")
+    
+    def partial_results(self, server_urls, status):
+        """已完成的服务器保留其结果，其余标记为 status；登录后才发现服务器时使用当前的服务器列表"""
+        if server_urls is None:
+            server_urls = self.server_list
+            if not server_urls:
+                return [ServerResult("", status)]
+        return [self.browser_results.get(url) or ServerResult(server_id_from_url(url), status) for url in server_urls]
+    
+    async def launch_and_run(self, server_urls, has_cookie, has_email, session_state=None, browser_provider=None):
+        """启动浏览器（或使用共享浏览器）登录并处理指定服务器"""
+        async with AsyncExitStack() as stack:
+            context = await self.open_context(stack, session_state, browser_provider)
+            return await self.run_in_context(context, server_urls, has_cookie, has_email, session_state)
+    
+    async def process_discovered(self, context, page):
+        """用登录后的 cookies 自动发现服务器，跳过未到续期时间的服务器，处理其余服务器"""
+        await self.discover_servers(await self.context_cookies(context))
+        if not self.server_list:
+            self.log("未设置服务器URL列表，自动发现也没有找到服务器", "ERROR")
+            return [ServerResult("", "no_servers")]
+        
+        results = self.skip_not_due(self.renew_state)
+        pending = [i for i, result in enumerate(results) if result is None]
+        for i, result in enumerate(results):
+            if result is not None:
+                self.browser_results[self.server_list[i]] = result
+        if not pending:
+            self.log("✅ 所有服务器都未到续期时间，无需处理")
+            return results
+        
+        browser_results = await self.process_servers(context, page, [self.server_list[i] for i in pending])
+        for i, result in zip(pending, browser_results):
+            results[i] = result
+        return results
+    
+    async def open_context(self, stack, session_state=None, browser_provider=None):
+        """打开浏览器上下文（持久化配置 / 共享浏览器 / 自行启动的浏览器），由 stack 负责关闭"""
+        if self.profile_dir:
+            # 持久化配置目录只能被一个浏览器进程使用，因此每个账号单独启动
+            self.log(f"使用持久化浏览器配置: {self.profile_dir}")
+            playwright = await stack.enter_async_context(playwright_api().async_playwright())
+            context = await self.launch_persistent_context(playwright)
+            stack.push_async_callback(context.close)
+            if not self.plaintext_session_allowed():
+                # CI 中配置目录会进入 Actions 缓存：关闭前（回调后进先出）清除 cookies，
+                # 配置目录只保留 HTTP 缓存，登录会话只通过加密的会话缓存保留
+                stack.push_async_callback(self.clear_profile_cookies, context)
+            if session_state:
+                await context.add_cookies(session_state.get('cookies', []))
+            return context
+        
+        if browser_provider:
+            browser = await browser_provider()
+        else:
+            # 启动浏览器
+            playwright = await stack.enter_async_context(playwright_api().async_playwright())
+            browser = await self.launch_browser(playwright)
+            stack.push_async_callback(browser.close)
+        
+        # 创建浏览器上下文（有会话缓存时直接载入）
+        if session_state:
+            context = await browser.new_context(storage_state=session_state)
+        else:
+            context = await browser.new_context()
+        stack.push_async_callback(context.close)
+        return context
+    
+    async def run_in_context(self, context, server_urls, has_cookie, has_email, session_state=None):
+        """在给定的浏览器上下文中登录并处理指定服务器"""
+        await self.install_route_filter(context)
+        await self.diagnostics.attach(context)
+        
+        # 创建页面
+        page = await self.create_page(context)
+        
+        # 如果登录成功，使用页面池处理所有服务器
+        if await self.login(context, page, has_cookie, has_email, session_state):
+            if server_urls is None:
+                results = await self.process_discovered(context, page)
+            else:
+                results = await self.process_servers(context, page, server_urls)
+            
+            # 保存运行过程中刷新的会话 cookies，保持原有的创建时间
+            await self.save_session_state(context, self.session_created_at)
+        else:
+            self.log("❌ 所有登录方式都失败了", "ERROR")
+            results = self.partial_results(server_urls, "login_failed")
+        
+        self.log_route_stats()
+        return results
+    
+    async def login(self, context, page, has_cookie, has_email, session_state=None):
+        """依次尝试缓存会话、Cookie、邮箱密码登录，新登录成功时保存会话"""
+        login_success = False
+        fresh_login = False
+        
+        # 方案0: 使用缓存的会话
+        if session_state:
+            self.log("检查缓存会话状态...")
+            if await self.verify_login(context, page):
+                self.log("✅ 缓存会话有效，跳过登录！")
+                login_success = True
+            else:
+                self.log("缓存会话已被拒绝，重新登录", "WARNING")
+                self.invalidate_session_state()
+                await context.clear_cookies()
+        
+        # 方案1: 尝试 Cookie 登录
+        if not login_success and has_cookie:
+            with self.metrics.span("login_with_cookies"):
+                cookies_added = await self.login_with_cookies(context)
+            if cookies_added:
+                self.log("检查Cookie登录状态...")
+                if await self.verify_login(context, page):
+                    self.log("✅ Cookie 登录成功！")
+                    login_success = fresh_login = True
                 else:
-                    self.log("❌ 所有登录方式都失败了", "ERROR")
-                    results = ["login_failed"] * len(self.server_list)
+                    self.log("Cookie 登录失败，cookies 可能已过期", "WARNING")
+        
+        # 方案2: 如果 Cookie 登录失败，尝试邮箱密码登录
+        if not login_success and has_email:
+            with self.metrics.span("login_with_email"):
+                email_logged_in = await self.login_with_email(page)
+            if email_logged_in:
+                self.log("检查邮箱密码登录状态...")
+                if await self.verify_login(context, page):
+                    self.log("✅ 邮箱密码登录成功！")
+                    login_success = fresh_login = True
+        
+        if fresh_login:
+            await self.save_session_state(context)
+        return login_success
+    
+    def daemon_due_at(self, state, server_id, now, processed=False):
+        """常驻模式下服务器的下次处理时间（加随机抖动）；刚处理过的服务器至少间隔 daemon_retry"""
+        due_at = max(state.next_due(server_id, self.renew_interval, self.renew_window), now)
+        if processed:
+            due_at = max(due_at, now + self.daemon_retry)
+        return due_at + random.uniform(0, self.daemon_jitter)
+    
+    async def refresh_expiry(self, context, state, server_urls):
+        """只读取到期时间（不点击续期），用于常驻模式启动时补全未知到期时间的服务器，以及续期成功后读取新的到期时间"""
+        page = await self.create_page(context)
+        try:
+            for server_url in server_urls:
+                server_id = server_id_from_url(server_url)
+                try:
+                    await self.goto(page, server_url, server_id)
+                    expires_at = await self.read_expiry(page, server_id)
+                except Exception as e:
+                    self.log(f"⚠️ 服务器 {server_id} 读取到期时间失败: {e}")
+                    continue
+                if expires_at:
+                    state.update_expiry(server_id, expires_at)
+        finally:
+            await self.close_page(page)
+    
+    async def run_daemon_async(self, browser_provider=None):
+        """常驻模式：保持浏览器和登录会话，按到期时间堆依次在续期窗口打开时处理服务器"""
+        self.log(f"🕒 常驻模式启动，共 {len(self.server_list)} 个服务器")
+        has_cookie = self.has_cookie_auth()
+        has_email = self.has_email_auth()
+        session_state = self.load_session_state()
+        state = self.renew_state.load()
+        
+        async with AsyncExitStack() as stack:
+            context = await self.open_context(stack, session_state, browser_provider)
+            await self.install_route_filter(context)
+            await self.diagnostics.attach(context)
+            
+            page = await self.create_page(context)
+            try:
+                if not await self.login(context, page, has_cookie, has_email, session_state):
+                    self.log("❌ 所有登录方式都失败了，常驻模式退出", "ERROR")
+                    return
+            finally:
+                await self.close_page(page)
+            
+            if self.discover_mode != 'off':
+                await self.discover_servers(await self.context_cookies(context))
+            unknown = [url for url in self.server_list
+                       if not state.servers.get(server_id_from_url(url), {}).get('expires_at')]
+            if unknown:
+                self.log(f"读取 {len(unknown)} 个服务器的到期时间...")
+                await self.refresh_expiry(context, state, unknown)
+                state.save()
+            
+            now = time.time()
+            heap = [(self.daemon_due_at(state, server_id_from_url(url), now), url) for url in self.server_list]
+            heapq.heapify(heap)
+            
+            while heap:
+                due_at, server_url = heap[0]
+                delay = due_at - time.time()
+                if delay > 0:
+                    wake_at = datetime.fromtimestamp(due_at, timezone.utc).astimezone(self.panel_tz)
+                    self.log(f"💤 下一个服务器 {server_id_from_url(server_url)} "
+                             f"将于 {wake_at:%Y-%m-%d %H:%M:%S} 处理，休眠 {min(delay, self.daemon_max_sleep):.0f}s")
+                    await asyncio.sleep(min(delay, self.daemon_max_sleep))
+                    # 醒来后确认会话仍有效，失效时重新登录
+                    if await self.probe_login(context, refresh=True) is False:
+                        await self.daemon_relogin(context, has_cookie, has_email)
+                    # 发现缓存过期后重新获取服务器列表，新服务器加入堆中
+                    if self.discover_mode != 'off' and self.load_discovered() is None:
+                        known = set(self.server_list)
+                        await self.discover_servers(await self.context_cookies(context))
+                        now = time.time()
+                        for server_url in self.server_list:
+                            if server_url not in known:
+                                heapq.heappush(heap, (self.daemon_due_at(state, server_id_from_url(server_url), now), server_url))
+                    continue
                 
-                browser.close()
-                return results
+                # 已从账号中移除的服务器直接出堆，不再处理
+                now = time.time()
+                due = []
+                while heap and heap[0][0] <= now:
+                    server_url = heapq.heappop(heap)[1]
+                    if server_url in self.server_list:
+                        due.append(server_url)
+                if not due:
+                    continue
                 
-        except TimeoutError as e:
-            self.log(f"操作超时: {e}", "ERROR")
-            return ["error: timeout"] * len(self.server_list)
-        except Exception as e:
-            self.log(f"运行时出错: {e}", "ERROR")
-            return ["error: runtime"] * len(self.server_list)
+                # 直接更新内存中的状态并保存：重新从磁盘读取会丢掉本批次学到的按钮查找策略
+                results = await self.daemon_renew(context, due, has_cookie, has_email)
+                self.update_renew_state(state, results)
+                # 续期成功后旧的到期时间已清除，重新读取，下次按新的到期时间安排而不是退回固定间隔
+                renewed = [url for url, result in zip(due, results) if result.status == "success"]
+                if renewed:
+                    await self.refresh_expiry(context, state, renewed)
+                    state.save()
+                now = time.time()
+                for server_url in due:
+                    heapq.heappush(heap, (self.daemon_due_at(state, server_id_from_url(server_url), now, True), server_url))
     
-    def write_readme_file(self, results):
-        """写入README文件"""
+    async def context_cookies(self, context):
+        """取出上下文中属于面板域名的 cookies"""
+        return {cookie['name']: cookie['value'] for cookie in await context.cookies(self.url)}
+    
+    async def daemon_relogin(self, context, has_cookie, has_email):
+        """会话失效时在同一上下文中重新登录"""
+        self.log("会话已失效，重新登录", "WARNING")
+        await context.clear_cookies()
+        page = await self.create_page(context)
         try:
-            # 获取东八区时间
-            from datetime import datetime, timezone, timedelta
-            beijing_time = datetime.now(timezone(timedelta(hours=8)))
-            timestamp = beijing_time.strftime('%Y-%m-%d %H:%M:%S')
-            
-            # 状态消息映射
-            status_messages = {
-                "success": "✅ 续期成功",
-                "already_renewed": "⚠️ 已经续期过了",
-                "no_button_found": "❌ 未找到续期按钮",
-                "button_disabled": "❌ 续期按钮不可点击",
-                "login_failed": "❌ 登录失败", 
-                "error": "💥 运行出错",
-                "click_error": "💥 点击按钮出错",
-                "unknown_changed": "⚠️ 页面变化但结果未知",
-                "no_change": "⚠️ 页面无变化",
-                "error: no_auth": "❌ 无认证信息",
-                "error: no_servers": "❌ 无服务器配置",
-                "error: timeout": "⏰ 操作超时",
-                "error: runtime": "💥 运行时错误"
+            return await self.login(context, page, has_cookie, has_email)
+        finally:
+            await self.close_page(page)
+    
+    async def daemon_renew(self, context, server_urls, has_cookie, has_email):
+        """常驻模式下处理一批到期的服务器，处理完后关闭页面，只保留上下文"""
+        self.metrics = RunMetrics()
+        self.first_navigation_done = False
+        self.outcomes.clear()
+        self.wait_timings.clear()
+        self.log(f"⏰ {len(server_urls)} 个服务器进入续期窗口")
+        
+        with self.metrics.span("run"):
+            if self.login_probe is False and not await self.daemon_relogin(context, has_cookie, has_email):
+                results = [ServerResult(server_id_from_url(url), "login_failed") for url in server_urls]
+            else:
+                page = await self.create_page(context)
+                try:
+                    results = await self.process_servers(context, page, server_urls)
+                finally:
+                    await self.close_page(page)
+                await self.save_session_state(context, self.session_created_at)
+        
+        for result in results:
+            self.log(f"服务器处理结果: {result}")
+        self.write_metrics(results)
+        self.append_history(results)
+        return results
+    
+    def build_metrics(self, results):
+        """整理本次运行的指标，包含每个服务器的分阶段耗时"""
+        servers = {}
+        for result in results:
+            if not result.server_id:
+                continue
+            servers[result.server_id] = {
+                'result': result.status,
+                'attempts': result.attempts,
+                'total': self.metrics.server_total(result.server_id),
+                'spans': self.metrics.servers.get(result.server_id, []),
+                'waits': self.wait_timings.get(result.server_id, {}),
+                'evidence': result.evidence or None,
             }
-            
-            # 创建README内容
-            readme_content = f"""# Weirdhost 自动续期脚本
+        run_span = next((r for r in self.metrics.spans if r['name'] == 'run'), {})
+        return {
+            'started_at': datetime.fromtimestamp(self.metrics.started_at, timezone.utc).isoformat(),
+            'duration': run_span.get('duration'),
+            'concurrency': self.concurrency,
+            'phases': self.metrics.summary(),
+            'startup': self.startup_metrics(),
+            'spans': self.metrics.spans,
+            'servers': servers,
+            'requests': self.route_stats,
+        }
+    
+    def startup_metrics(self):
+        """浏览器启动和第一次导航的耗时，用于比较冷启动和持久化配置"""
+        records = self.metrics.spans + [r for records in self.metrics.servers.values() for r in records]
+        launch = next((r for r in records if r['name'] == 'browser_launch'), None)
+        first = next((r for r in records if r['name'] == 'goto' and r.get('first')), None)
+        return {
+            'persistent_profile': bool(launch and launch.get('persistent')),
+            'browser_launch': launch['duration'] if launch else None,
+            'first_navigation': first['duration'] if first else None,
+        }
+    
+    def report_metrics(self, results):
+        """指标文件和 README 使用的指标：合并分片时为合并后的指标"""
+        return self.merged_metrics or self.build_metrics(results)
+    
+    def has_metrics(self):
+        return bool(self.merged_metrics or self.metrics.spans)
+    
+    def partial_record(self, results):
+        """分片运行的结果记录，由 merge 子命令合并"""
+        return {
+            'account': self.account_name,
+            'servers': [server_id_from_url(url) for url in self.all_servers],
+            'results': [result.to_dict() for result in results],
+            'metrics': self.build_metrics(results) if self.metrics.spans else None,
+            'history': self.history_summary,
+        }
+    
+    def write_metrics(self, results):
+        """写入 JSON 指标文件"""
+        try:
+            with open(self.metrics_file, 'w', encoding='utf-8') as f:
+                json.dump(self.report_metrics(results), f, ensure_ascii=False, indent=2)
+            self.log(f"📈 运行指标已写入 {self.metrics_file}")
+        except Exception as e:
+            self.log(f"写入运行指标失败: {e}", "ERROR")
+    
+    def metrics_table(self, results):
+        """生成 README 中的耗时汇总表"""
+        metrics = self.report_metrics(results)
+        lines = [
+            "",
+            "## 运行耗时",
+            "",
+            f"总耗时: `{metrics['duration']}s`，并发数: `{metrics['concurrency']}`",
+            "",
+            "| 阶段 | 次数 | 总耗时 (s) | 平均 (s) | 最大 (s) |",
+            "| --- | --- | --- | --- | --- |",
+        ]
+        for name, phase in metrics['phases'].items():
+            lines.append(f"| {name} | {phase['count']} | {phase['total']} | {phase['mean']} | {phase['max']} |")
+        lines += [
+            "",
+            "| 服务器 | 结果 | 耗时 (s) | 按钮策略 |",
+            "| --- | --- | --- | --- |",
+        ]
+        for server_id, server in metrics['servers'].items():
+            strategy = next((r.get('strategy') for r in server['spans'] if r['name'] == 'find_renew_button'), None)
+            lines.append(f"| `{server_id}` | {server['result']} | {server['total']} | {strategy or '-'} |")
+        return '\n'.join(lines) + '\n'
+    
+    @staticmethod
+    def readme_header():
+        """README 标题和运行时间"""
+        # 获取东八区时间
+        beijing_time = datetime.now(timezone(timedelta(hours=8)))
+        timestamp = beijing_time.strftime('%Y-%m-%d %H:%M:%S')
+        return f"""# Weirdhost 自动续期脚本
 
 **最后运行时间**: `{timestamp}` (北京时间)
 
 ## 运行结果
 
 """
+    
+    def render_results(self, results):
+        """将结果列表渲染为 README 列表项"""
+        content = ""
+        for result in results:
+            status_msg = self.STATUS_MESSAGES.get(result.status, f"❓ 未知状态 ({result.status})")
+            if result.server_id:
+                content += f"- 服务器 `{result.server_id}`: {status_msg}\n"
+            else:
+                content += f"- {status_msg}\n"
+        return content
+    
+    def render_history(self):
+        """根据运行历史汇总渲染每个服务器的成功率、平均续期耗时和最近结果"""
+        summary = self.history_summary
+        if not summary or not summary['servers']:
+            return ""
+        icons = {"success": "✅", "already_renewed": "☑️", "skipped": "⏭️"}
+        lines = [
+            "",
+            f"## 历史统计（共 {summary['runs']} 次运行）",
+            "",
+            "| 服务器 | 处理次数 | 成功率 | 平均续期耗时 (s) | 最近结果 |",
+            "| --- | --- | --- | --- | --- |",
+        ]
+        for server_id, entry in summary['servers'].items():
+            rate = f"{entry['ok'] / entry['runs']:.0%}" if entry['runs'] else "-"
+            latency = round(entry['latency_total'] / entry['renewed'], 3) if entry['renewed'] else "-"
+            recent = ''.join(icons.get(status, "❌") for status in entry['recent'])
+            lines.append(f"| `{server_id}` | {entry['runs']} | {rate} | {latency} | {recent} |")
+        return '\n'.join(lines) + '\n'
+    
+    def write_readme_file(self, results):
+        """写入README文件"""
+        try:
+            # 创建README内容，添加每个服务器的结果
+            readme_content = self.readme_header() + self.render_results(results) + self.render_history()
             
-            # 添加每个服务器的结果
-            for result in results:
-                if ":" in result and not result.startswith("error:"):
-                    # 正确分割服务器ID和状态
-                    parts = result.split(":", 1)
-                    server_id = parts[0].strip()
-                    status = parts[1].strip() if len(parts) > 1 else "unknown"
-                    # 检查状态是否包含服务器ID
-                    if ":" in status:
-                        # 如果状态中还包含冒号，说明分割有问题，重新处理
-                        status_parts = status.split(":", 1)
-                        server_id = f"{server_id}:{status_parts[0]}"
-                        status = status_parts[1].strip() if len(status_parts) > 1 else "unknown"
-                        
-                    status_msg = status_messages.get(status, f"❓ 未知状态 ({status})")
-                    readme_content += f"- 服务器 `{server_id}`: {status_msg}\n"
-                else:
-                    # 处理错误状态
-                    status_msg = status_messages.get(result, f"❓ 未知状态 ({result})")
-                    readme_content += f"- {status_msg}\n"
+            # 可选：追加运行耗时汇总
+            if self.readme_metrics and self.has_metrics():
+                readme_content += self.metrics_table(results)
             
             # 写入README文件
             with open('README.md', 'w', encoding='utf-8') as f:
@@ -505,17 +2634,265 @@ class WeirdhostLogin:
             self.log(f"写入README文件失败: {e}", "ERROR")
 
 
-def main():
-    """主函数"""
-    print("🚀 Weirdhost 自动续期脚本启动")
+async def run_accounts_async(logins, daemon=False):
+    """多账号运行：所有账号共享一个浏览器（按需启动），每个账号使用独立的上下文并发处理
+
+    daemon 为 True 时以常驻模式运行，收到 SIGINT/SIGTERM 后关闭浏览器退出
+    """
+    playwright = None
+    browser = None
+    lock = asyncio.Lock()
+    
+    async def browser_provider():
+        nonlocal playwright, browser
+        async with lock:
+            if browser is None:
+                playwright = await playwright_api().async_playwright().start()
+                browser = await logins[0].launch_browser(playwright)
+        return browser
+    
+    if daemon:
+        loop = asyncio.get_running_loop()
+        task = asyncio.current_task()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(sig, task.cancel)
+            except NotImplementedError:
+                # Windows 不支持，Ctrl+C 仍会以 KeyboardInterrupt 退出
+                pass
+    
+    try:
+        if daemon:
+            return list(await asyncio.gather(*(login.run_daemon_async(browser_provider) for login in logins)))
+        return list(await asyncio.gather(*(login.run_async(browser_provider) for login in logins)))
+    finally:
+        if browser:
+            await browser.close()
+        if playwright:
+            await playwright.stop()
+
+
+def run_accounts(logins):
+    """多账号运行，返回与 logins 对应的结果列表"""
+    return asyncio.run(run_accounts_async(logins))
+
+
+def run_daemon(logins):
+    """常驻模式：直到收到停止信号或所有账号登录失败才退出"""
+    print(f"🕒 常驻模式: {len(logins)} 个账号")
+    try:
+        asyncio.run(run_accounts_async(logins, daemon=True))
+    except (KeyboardInterrupt, asyncio.CancelledError):
+        pass
+    print("👋 常驻模式已停止")
+    sys.exit(EXIT_OK)
+
+
+def write_accounts_readme(account_results):
+    """按账号汇总写入README文件"""
+    try:
+        readme_content = WeirdhostLogin.readme_header()
+        for login, results in account_results:
+            readme_content += f"### 账号 `{login.account_name}`\n\n"
+            readme_content += login.render_results(results) + login.render_history() + "\n"
+            if login.readme_metrics and login.has_metrics():
+                readme_content += login.metrics_table(results) + "\n"
+        
+        with open('README.md', 'w', encoding='utf-8') as f:
+            f.write(readme_content)
+        print("📝 README已更新")
+        
+    except Exception as e:
+        print(f"写入README文件失败: {e}")
+
+def write_partial_file(account_results, shard):
+    """写入本分片的结果文件"""
+    index, count = shard
+    directory = os.getenv('WEIRDHOST_PARTIAL_DIR') or 'partials'
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"results-{index}-of-{count}.json")
+    partial = {
+        'shard': index,
+        'count': count,
+        'accounts': [login.partial_record(results) for login, results in account_results],
+    }
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(partial, f, ensure_ascii=False)
+    print(f"🧩 分片结果已写入 {path}")
+
+
+def merge_metrics(parts):
+    """合并各分片的运行指标：阶段耗时累加，总耗时取最长的分片"""
+    parts = [part for part in parts if part]
+    if not parts:
+        return None
+    phases = {}
+    requests = {'blocked': 0, 'blocked_by_reason': {}, 'loaded': 0, 'bytes_loaded': 0}
+    servers = {}
+    for part in parts:
+        for name, phase in part['phases'].items():
+            merged = phases.setdefault(name, {'count': 0, 'total': 0.0, 'max': 0.0})
+            merged['count'] += phase['count']
+            merged['total'] = round(merged['total'] + phase['total'], 3)
+            merged['max'] = max(merged['max'], phase['max'])
+        for key in ('blocked', 'loaded', 'bytes_loaded'):
+            requests[key] += part['requests'].get(key, 0)
+        for reason, n in part['requests'].get('blocked_by_reason', {}).items():
+            requests['blocked_by_reason'][reason] = requests['blocked_by_reason'].get(reason, 0) + n
+        servers.update(part['servers'])
+    for phase in phases.values():
+        phase['mean'] = round(phase['total'] / phase['count'], 3)
+    return {
+        'started_at': min(part['started_at'] for part in parts),
+        'duration': max(part['duration'] or 0 for part in parts),
+        'concurrency': parts[0]['concurrency'],
+        'shards': len(parts),
+        'phases': phases,
+        'startup': [part['startup'] for part in parts],
+        'spans': [span for part in parts for span in part['spans']],
+        'servers': servers,
+        'requests': requests,
+    }
+
+
+def merge_history(summaries):
+    """合并各分片的历史汇总（各分片的服务器互不重叠）"""
+    summaries = [summary for summary in summaries if summary]
+    if not summaries:
+        return None
+    merged = {'runs': max(summary['runs'] for summary in summaries), 'servers': {}}
+    for summary in summaries:
+        merged['servers'].update(summary['servers'])
+    return merged
+
+
+def merge_partials(paths):
+    """合并分片结果文件，返回与多账号运行相同结构的 (login, results) 列表"""
+    entries = {}
+    count = None
+    seen = set()
+    for path in sorted(paths):
+        with open(path, 'r', encoding='utf-8') as f:
+            partial = json.load(f)
+        if count is not None and partial['count'] != count:
+            raise ValueError(f"{path} 的分片数 {partial['count']} 与其他结果文件 ({count}) 不一致")
+        count = partial['count']
+        seen.add(partial['shard'])
+        for item in partial['accounts']:
+            entry = entries.setdefault(item['account'], {
+                'servers': item['servers'], 'results': [], 'metrics': [], 'history': [],
+            })
+            entry['results'] += [ServerResult.from_dict(data) for data in item['results']]
+            entry['metrics'].append(item['metrics'])
+            entry['history'].append(item['history'])
+    
+    missing = sorted(set(range(count or 0)) - seen)
+    if missing:
+        print(f"⚠️ 缺少分片结果: {', '.join(f'{index}/{count}' for index in missing)}")
+    
+    account_results = []
+    for name, entry in entries.items():
+        login = WeirdhostLogin({'name': name} if name else None)
+        # 缺失分片中的服务器标记为 shard_missing
+        for server_id in entry['servers']:
+            if shard_of(server_id, count) in missing:
+                entry['results'].append(ServerResult(server_id, "shard_missing"))
+        order = {server_id: i for i, server_id in enumerate(entry['servers'])}
+        rank = lambda server_id: order.get(server_id, len(order))
+        results = sorted(entry['results'], key=lambda result: rank(result.server_id))
+        login.merged_metrics = merge_metrics(entry['metrics'])
+        login.history_summary = merge_history(entry['history'])
+        # 指标和历史表格也按原服务器顺序排列
+        for merged in (login.merged_metrics, login.history_summary):
+            if merged:
+                merged['servers'] = dict(sorted(merged['servers'].items(), key=lambda item: rank(item[0])))
+        account_results.append((login, results))
+    return account_results
+
+
+def print_summary(account_results):
+    """打印结果汇总并按是否有失败退出"""
+    flush_logs()
     print("=" * 50)
+    print("📊 运行结果汇总:")
+    failed = False
+    for login, results in account_results:
+        indent = "  "
+        if login.account_name:
+            print(f"  [{login.account_name}]")
+            indent = "    "
+        for result in results:
+            print(f"{indent}- {result}")
+        failed = failed or any(result.failed for result in results)
     
-    # 创建登录器
-    login = WeirdhostLogin()
+    if failed:
+        print("❌ 续期任务有失败的情况！")
+        sys.exit(EXIT_FAILED)
+    print("🎉 续期任务完成！")
+    sys.exit(EXIT_OK)
+
+
+def write_reports(account_results):
+    """写入指标文件和 README：单账号与原有格式一致，多账号按账号汇总"""
+    for login, results in account_results:
+        if login.merged_metrics:
+            login.write_metrics(results)
+    if len(account_results) == 1 and not account_results[0][0].account_name:
+        login, results = account_results[0]
+        login.write_readme_file(results)
+    else:
+        write_accounts_readme(account_results)
+
+
+def run_merge(paths):
+    """merge 子命令：合并各分片的结果文件"""
+    if not paths:
+        print("❌ 错误：未指定分片结果文件！")
+        sys.exit(EXIT_FAILED)
+    try:
+        account_results = merge_partials(paths)
+    except (OSError, ValueError, KeyError) as e:
+        print(f"❌ 错误：合并分片结果失败: {e}")
+        sys.exit(EXIT_FAILED)
+    
+    print(f"🧩 已合并 {len(paths)} 个分片结果文件")
+    write_reports(account_results)
+    print_summary(account_results)
+
+
+def config_problems(logins):
+    """检查配置，返回 (退出码, 说明) 列表；不导入 Playwright，也不访问网络"""
+    problems = []
+    for name in NUMERIC_SETTINGS:
+        value = os.getenv(name, '').strip()
+        if not value:
+            continue
+        try:
+            float(value)
+        except ValueError:
+            problems.append((EXIT_BAD_VALUE, f"{name}={value!r} 不是有效的数值"))
+    for name, choices in (('WEIRDHOST_LOG_LEVEL', LOG_LEVELS), ('WEIRDHOST_LOG_FORMAT', LOG_FORMATS),
+                          ('WEIRDHOST_DIAGNOSTICS', FailureDiagnostics.LEVELS)):
+        value = os.getenv(name, '').strip()
+        if value and value.upper() not in choices and value.lower() not in choices:
+            problems.append((EXIT_BAD_VALUE, f"{name}={value!r} 无效（可选 {'/'.join(choices)}）"))
     
-    # 检查环境变量
-    if not login.has_cookie_auth() and not login.has_email_auth():
-        print("❌ 错误：未设置认证信息！")
+    for login in logins:
+        prefix = f"账号 {login.account_name}: " if login.account_name else ""
+        if not login.has_cookie_auth() and not login.has_email_auth():
+            problems.append((EXIT_NO_AUTH, f"{prefix}未设置认证信息（cookie 或 email/password）"))
+        for url in login.invalid_servers:
+            problems.append((EXIT_BAD_URL, f"{prefix}无效的服务器地址: {url}"))
+        if login.discover_mode not in ('off', 'merge', 'filter', 'replace'):
+            problems.append((EXIT_BAD_VALUE, f"{prefix}WEIRDHOST_DISCOVER={login.discover_mode!r} 无效（可选 off/merge/filter/replace）"))
+        if not login.has_servers() and not login.invalid_servers:
+            problems.append((EXIT_NO_SERVERS, f"{prefix}未设置服务器列表"))
+    return problems
+
+
+def print_config_help(code):
+    """单账号配置错误时的设置说明"""
+    if code == EXIT_NO_AUTH:
         print("\n请在 GitHub Secrets 中设置以下任一组合：")
         print("\n方案1 - Cookie 认证：")
         print("REMEMBER_WEB_COOKIE: 你的cookie值")
@@ -523,34 +2900,160 @@ def main():
         print("WEIRDHOST_EMAIL: 你的邮箱")
         print("WEIRDHOST_PASSWORD: 你的密码")
         print("\n推荐使用 Cookie 认证，更稳定可靠")
-        sys.exit(1)
-    
-    # 检查服务器URL列表
-    if not login.server_list:
-        print("❌ 错误：未设置服务器URL列表！")
+    elif code == EXIT_NO_SERVERS:
         print("\n请在 GitHub Secrets 中设置：")
         print("WEIRDHOST_SERVER_URLS: https://hub.weirdhost.xyz/server/服务器ID1,https://hub.weirdhost.xyz/server/服务器ID2")
         print("\n示例: https://hub.weirdhost.xyz/server/abc12345,https://hub.weirdhost.xyz/server/abc67890")
-        sys.exit(1)
+
+
+def print_plan(logins, shard=None):
+    """打印执行计划：认证方式、运行参数和每个服务器是否会被处理"""
+    now = time.time()
+    flush_logs()
+    print("📋 执行计划:")
+    for login in logins:
+        if login.account_name:
+            print(f"  [{login.account_name}]")
+        auth = [name for name, ok in (("Cookie", login.has_cookie_auth()),
+                                      ("邮箱密码", login.has_email_auth()),
+                                      ("会话缓存", os.path.exists(login.session_cache))) if ok]
+        print(f"  认证方式: {', '.join(auth) or '无'}")
+        if login.session_ttl > 0 and not login.session_key and not login.plaintext_session_allowed():
+            print("  ⚠️ CI 环境中未设置 WEIRDHOST_SESSION_KEY，登录会话不会被缓存")
+        if login.profile_dir and not login.plaintext_session_allowed():
+            print("  CI 环境中持久化配置目录只保留 HTTP 缓存，退出前清除 cookies")
+        print(f"  HTTP 快速续期: {'开启' if login.http_renew else '关闭'}，并发数: {login.concurrency}，"
+              f"运行预算: {f'{login.run_budget:.0f}s' if login.run_budget > 0 else '不限制'}")
+        for url in login.duplicate_servers:
+            print(f"  ⚠️ 重复的服务器地址已忽略: {url}")
+        if login.discover_mode != 'off':
+            # 只使用未过期的发现缓存预览，不访问网络
+            cached = login.load_discovered()
+            if cached is not None:
+                source = f"缓存中有 {len(cached)} 个服务器"
+            elif login.has_cookie_auth() or os.path.exists(login.session_cache):
+                source = "无有效缓存，运行时请求服务器列表（cookie 未通过验证时在浏览器登录后请求）"
+            else:
+                source = "无有效缓存，没有可用的 cookie，浏览器登录后请求服务器列表"
+            print(f"  自动发现: {login.discover_mode}，{source}")
+            if cached is not None:
+                login.apply_discovered(cached)
+        
+        state = RenewState(login.state_file).load()
+        print(f"  服务器 ({len(login.server_list)}):")
+        for url in login.server_list:
+            server_id = server_id_from_url(url)
+            if shard and shard_of(server_id, shard[1]) != shard[0]:
+                action = f"属于分片 {shard_of(server_id, shard[1])}/{shard[1]}，本次不处理"
+            elif not login.force and not state.is_due(server_id, now, login.renew_interval, login.renew_window):
+                action = "未到续期时间，跳过"
+            else:
+                action = "续期"
+            print(f"    - {server_id}: {action}  ({url})")
+
+
+def configure_logging(quiet=False):
+    """按 WEIRDHOST_LOG_LEVEL / WEIRDHOST_LOG_FORMAT 配置日志；安静模式只输出警告和错误"""
+    level = (os.getenv('WEIRDHOST_LOG_LEVEL') or '').strip().upper()
+    if level not in LOG_LEVELS:
+        # debug 诊断级别需要逐个选择器的调试日志
+        level = 'DEBUG' if (os.getenv('WEIRDHOST_DIAGNOSTICS') or '').lower() == 'debug' else 'INFO'
+    if quiet:
+        level = 'WARNING' if level in ('DEBUG', 'INFO') else level
+    fmt = (os.getenv('WEIRDHOST_LOG_FORMAT') or '').strip().lower()
+    setup_logging(level, fmt if fmt in LOG_FORMATS else 'text')
+
+
+def build_logins(accounts, force=False):
+    """根据多账号配置（为空时使用环境变量中的单账号配置）创建登录器"""
+    logins = [WeirdhostLogin(account) for account in accounts] if accounts else [WeirdhostLogin()]
+    for login in logins:
+        login.force = force
+    return logins
+
+
+def main():
+    """主函数"""
+    print("🚀 Weirdhost 自动续期脚本启动")
+    print("=" * 50)
     
-    # 执行续期任务
-    results = login.run()
+    parser = argparse.ArgumentParser(description="Weirdhost 自动续期脚本")
+    parser.add_argument('--force', action='store_true', help="忽略续期状态缓存，处理所有服务器")
+    parser.add_argument('--shard', type=parse_shard, metavar='I/N',
+                        help="只处理第 I 个分片（共 N 个，I 从 0 开始），结果写入分片结果文件")
+    parser.add_argument('--check', '--dry-run', dest='check', action='store_true',
+                        help="只检查配置并打印执行计划，不启动浏览器也不续期")
+    parser.add_argument('--daemon', action='store_true',
+                        help="常驻运行：保持浏览器会话，在每个服务器的续期窗口打开时续期")
+    parser.add_argument('-q', '--quiet', action='store_true',
+                        help="安静模式：只输出警告、错误和结果汇总")
+    subparsers = parser.add_subparsers(dest='command')
+    merge_parser = subparsers.add_parser('merge', help="合并各分片的结果文件，生成 README 和指标文件")
+    merge_parser.add_argument('files', nargs='+', help="分片结果文件")
+    args = parser.parse_args()
+    configure_logging(args.quiet)
     
-    # 写入README文件
-    login.write_readme_file(results)
+    if args.command == 'merge':
+        run_merge(args.files)
     
-    print("=" * 50)
-    print("📊 运行结果汇总:")
-    for result in results:
-        print(f"  - {result}")
+    # 多账号配置
+    try:
+        accounts = load_accounts()
+    except (OSError, ValueError) as e:
+        print(f"❌ 错误：多账号配置无效: {e}")
+        sys.exit(EXIT_BAD_ACCOUNTS)
     
-    # 检查是否有完全失败的情况
-    if any("login_failed" in result or "error:" in result for result in results):
-        print("❌ 续期任务有失败的情况！")
-        sys.exit(1)
+    logins = build_logins(accounts, args.force)
+    problems = config_problems(logins)
+    if args.check:
+        print_plan(logins, args.shard)
+        print("=" * 50)
+    if problems:
+        for code, message in problems:
+            print(f"❌ 错误：{message}")
+        code = problems[0][0]
+        if not accounts:
+            print_config_help(code)
+        sys.exit(code)
+    if args.check:
+        print("✅ 配置检查通过")
+        sys.exit(EXIT_OK)
+    
+    if args.shard:
+        for login in logins:
+            login.apply_shard(*args.shard)
+    if args.daemon:
+        run_daemon([login for login in logins if login.has_servers()])
+    if accounts:
+        run_multi_account(logins, args.shard)
+    
+    # 执行续期任务（分片中没有服务器时直接写出空结果）
+    login = logins[0]
+    results = login.run() if login.has_servers() else []
+    
+    if args.shard:
+        # 分片运行只写分片结果文件，README 由 merge 子命令统一生成
+        write_partial_file([(login, results)], args.shard)
+    else:
+        # 写入README文件
+        login.write_readme_file(results)
+    
+    print_summary([(login, results)])
+
+
+def run_multi_account(logins, shard=None):
+    """多账号模式：共享浏览器运行所有账号并按账号汇总结果"""
+    print(f"👥 多账号模式: {len(logins)} 个账号")
+    active = [login for login in logins if login.has_servers()]
+    results_by_login = dict(zip(map(id, active), run_accounts(active))) if active else {}
+    account_results = [(login, results_by_login.get(id(login), [])) for login in logins]
+    
+    if shard:
+        write_partial_file(account_results, shard)
     else:
-        print("🎉 续期任务完成！")
-        sys.exit(0)
+        write_accounts_readme(account_results)
+    
+    print_summary(account_results)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+本地模拟 Weirdhost 面板 - 用于离线测试和性能基准
+
+提供登录表单、服务器页面（带 시간추가 按钮）、续期接口和服务器列表接口，
+可配置每个请求的延迟和抖动。
+
+用法: python mock_panel.py --port 8080 --latency 50 --jitter 20
+"""
+
+import re
+import json
+import time
+import random
+import secrets
+import argparse
+import threading
+from http.cookies import SimpleCookie
+from datetime import datetime, timezone, timedelta
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+REMEMBER_COOKIE_NAME = 'remember_web_59ba36addc2b2f9401580f014c7f58ea4e30989d'
+
+LOGIN_PAGE = """<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>Login</title></head>
+<body>
+<form method="post" action="/auth/login">
+  <input name="username" type="text">
+  <input name="password" type="password">
+  <button type="submit">Login</button>
+</form>
+</body></html>"""
+
+DASHBOARD_PAGE = """<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>Dashboard</title></head>
+<body><div class="card">Mock Weirdhost</div></body></html>"""
+
+SERVER_PAGE = """<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>Server {server_id}</title></head>
+<body>
+<div class="server-details card">
+  <h1>Server {server_id}</h1>
+  <p>유통기한 {expires}</p>
+  <button class="btn btn-primary" id="renew">시간추가</button>
+</div>
+<script>
+document.getElementById('renew').addEventListener('click', async () => {{
+  const xsrf = decodeURIComponent((document.cookie.match(/XSRF-TOKEN=([^;]+)/) || [])[1] || '');
+  const response = await fetch('/api/client/notfreeservers/{server_id}/renew', {{
+    method: 'POST',
+    headers: {{'Content-Type': 'application/json', 'X-XSRF-TOKEN': xsrf, 'X-Requested-With': 'XMLHttpRequest'}},
+    body: '{{}}',
+  }});
+  const data = await response.json();
+  const toast = document.createElement('div');
+  toast.setAttribute('role', 'alert');
+  toast.className = 'toast';
+  toast.textContent = data.message || (data.errors && data.errors[0].detail) || 'error';
+  document.body.appendChild(toast);
+}});
+</script>
+</body></html>"""
+
+
+class MockPanel:
+    """模拟面板服务器，可在进程内启动（start/stop），也可以命令行运行"""
+
+    def __init__(self, host='127.0.0.1', port=0, latency=0.0, jitter=0.0,
+                 cookie='mock-cookie', email='user@example.com', password='password',
+                 servers=None, cooldown=3600 * 20):
+        self.latency = latency / 1000
+        self.jitter = jitter / 1000
+        self.cookie = cookie
+        self.email = email
+        self.password = password
+        self.servers = list(servers or [])
+        self.cooldown = cooldown
+        self.sessions = set()
+        self.renewed = {}
+        self.requests = 0
+        self.lock = threading.Lock()
+        self.server = ThreadingHTTPServer((host, port), self.handler_class())
+        self.server.daemon_threads = True
+        self.thread = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def server_url(self, server_id):
+        return f"{self.url}/server/{server_id}"
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def delay(self):
+        """模拟网络/服务器延迟"""
+        seconds = self.latency + random.uniform(-self.jitter, self.jitter)
+        if seconds > 0:
+            time.sleep(seconds)
+
+    def renew(self, server_id):
+        """续期服务器，冷却时间内重复续期返回失败"""
+        now = time.time()
+        with self.lock:
+            last = self.renewed.get(server_id)
+            if last and now - last < self.cooldown:
+                return False
+            self.renewed[server_id] = now
+            return True
+
+    def expires(self, server_id):
+        """服务器的到期时间（韩国时间）"""
+        base = self.renewed.get(server_id, time.time() - 3600 * 24)
+        expires = datetime.fromtimestamp(base, timezone(timedelta(hours=9))) + timedelta(days=3)
+        return expires.strftime('%Y-%m-%d %H:%M:%S')
+
+    def handler_class(self):
+        panel = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, format, *args):
+                pass
+
+            def cookies(self):
+                jar = SimpleCookie()
+                try:
+                    jar.load(self.headers.get('Cookie', ''))
+                except Exception:
+                    pass
+                return {name: morsel.value for name, morsel in jar.items()}
+
+            def authenticated(self):
+                cookies = self.cookies()
+                return (cookies.get(REMEMBER_COOKIE_NAME) == panel.cookie
+                        or cookies.get('pterodactyl_session') in panel.sessions)
+
+            def send(self, status, body='', content_type='text/html; charset=utf-8', headers=None):
+                # 响应头和正文一次写出，避免 Nagle 与延迟确认叠加
+                payload = body.encode('utf-8')
+                lines = [f"HTTP/1.1 {status} {self.responses.get(status, ('',))[0]}",
+                         f"Content-Type: {content_type}",
+                         f"Content-Length: {len(payload)}"]
+                for name, value in (headers or []):
+                    lines.append(f"{name}: {value}")
+                self.wfile.write(('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1') + payload)
+
+            def send_json(self, status, data, headers=None):
+                self.send(status, json.dumps(data), 'application/json', headers)
+
+            def session_headers(self):
+                """下发会话和 XSRF cookie"""
+                session = secrets.token_hex(8)
+                panel.sessions.add(session)
+                return [('Set-Cookie', f"pterodactyl_session={session}; Path=/; HttpOnly"),
+                        ('Set-Cookie', f"XSRF-TOKEN={secrets.token_hex(8)}%3D; Path=/")]
+
+            def redirect_login(self):
+                self.send(302, headers=[('Location', '/auth/login')])
+
+            def do_GET(self):
+                panel.requests += 1
+                panel.delay()
+                path = urlparse(self.path).path.rstrip('/') or '/'
+
+                if path == '/auth/login':
+                    return self.send(200, LOGIN_PAGE)
+                if not self.authenticated():
+                    if path.startswith('/api/'):
+                        return self.send_json(401, {'errors': [{'detail': 'Unauthenticated.'}]})
+                    return self.redirect_login()
+
+                if path == '/':
+                    return self.send(200, DASHBOARD_PAGE, headers=self.session_headers())
+                if path == '/api/client':
+                    data = [{'object': 'server', 'attributes': {'identifier': server_id, 'name': server_id}}
+                            for server_id in panel.servers]
+                    return self.send_json(200, {'object': 'list', 'data': data})
+                if path == '/api/client/account':
+                    return self.send_json(200, {'object': 'user', 'attributes': {'email': panel.email}})
+
+                match = re.fullmatch(r'/server/([\w-]+)', path)
+                if match:
+                    server_id = match.group(1)
+                    page = SERVER_PAGE.format(server_id=server_id, expires=panel.expires(server_id))
+                    return self.send(200, page, headers=self.session_headers())
+                self.send(404, 'Not Found')
+
+            def do_POST(self):
+                panel.requests += 1
+                panel.delay()
+                path = urlparse(self.path).path.rstrip('/')
+                body = self.rfile.read(int(self.headers.get('Content-Length', 0) or 0)).decode('utf-8')
+
+                if path == '/auth/login':
+                    form = parse_qs(body)
+                    if (form.get('username', [''])[0] == panel.email
+                            and form.get('password', [''])[0] == panel.password):
+                        return self.send(302, headers=[('Location', '/')] + self.session_headers())
+                    return self.send(200, LOGIN_PAGE)
+
+                match = re.fullmatch(r'/api/client/notfreeservers/([\w-]+)/renew', path)
+                if match:
+                    if not self.authenticated():
+                        return self.send_json(401, {'errors': [{'detail': 'Unauthenticated.'}]})
+                    if not self.headers.get('X-XSRF-TOKEN') and not self.headers.get('X-CSRF-TOKEN'):
+                        return self.send_json(419, {'errors': [{'detail': 'CSRF token mismatch.'}]})
+                    if panel.renew(match.group(1)):
+                        return self.send_json(200, {'success': True, 'message': '시간이 추가됨'})
+                    return self.send_json(400, {'errors': [{'detail': '이미 연장했습니다. 한번만 가능합니다.'}]})
+                self.send(404, 'Not Found')
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="本地模拟 Weirdhost 面板")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--latency', type=float, default=0.0, help="每个请求的延迟（毫秒）")
+    parser.add_argument('--jitter', type=float, default=0.0, help="延迟抖动（毫秒）")
+    parser.add_argument('--cookie', default='mock-cookie', help="有效的 remember_web cookie 值")
+    parser.add_argument('--servers', default='', help="服务器列表接口返回的服务器ID，逗号分隔")
+    args = parser.parse_args()
+
+    servers = [server_id.strip() for server_id in args.servers.split(',') if server_id.strip()]
+    panel = MockPanel(args.host, args.port, args.latency, args.jitter, cookie=args.cookie, servers=servers)
+    print(f"🧪 模拟面板已启动: {panel.url}")
+    try:
+        panel.server.serve_forever()
+    except KeyboardInterrupt:
+        panel.stop()
+
+
+if __name__ == "__main__":
+    main()
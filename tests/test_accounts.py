@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+"""
+多账号配置测试 - 字段类型校验
+"""
+
+import os
+import sys
+import json
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from main import WeirdhostLogin, load_accounts
+
+
+def accounts_from(monkeypatch, accounts):
+    monkeypatch.setenv('WEIRDHOST_ACCOUNTS', json.dumps(accounts))
+    return load_accounts()
+
+
+@pytest.mark.parametrize('account', [
+    {'name': 'a', 'cookie': 'x', 'servers': [123]},
+    {'name': 'a', 'cookie': 'x', 'servers': {'id': 'abc'}},
+    {'name': 5, 'cookie': 'x', 'servers': 'abc'},
+    {'name': 'a', 'cookie': ['x'], 'servers': 'abc'},
+])
+def test_invalid_field_types_are_rejected(monkeypatch, account):
+    with pytest.raises(ValueError):
+        accounts_from(monkeypatch, [account])
+
+
+def test_null_fields_are_treated_as_missing(monkeypatch):
+    accounts = accounts_from(monkeypatch, [{'name': 'a', 'cookie': None, 'email': 'e', 'password': 'p', 'servers': ['abc']}])
+    login = WeirdhostLogin(accounts[0])
+    assert login.remember_web_cookie == ''
+    assert login.session_fingerprint()
@@ -0,0 +1,19 @@
+# -*- coding: utf-8 -*-
+"""
+基准脚本测试 - 最近秩百分位数
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmark import percentile
+
+
+def test_nearest_rank_percentile():
+    assert percentile(list(range(1, 101)), 95) == 95
+    assert percentile(list(range(1, 101)), 50) == 50
+    assert percentile(list(range(1, 21)), 95) == 19
+    assert percentile([3.0], 95) == 3.0
+    assert percentile([], 95) == 0.0
@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+"""
+配置检查测试 - 服务器地址规范化和去重、配置错误对应的退出码，以及未安装 Playwright 时保留 HTTP 续期结果
+"""
+
+import os
+import sys
+import asyncio
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from main import (
+    WeirdhostLogin, ServerResult, normalize_server_url, config_problems,
+    EXIT_NO_AUTH, EXIT_NO_SERVERS, EXIT_BAD_URL, EXIT_BAD_VALUE,
+)
+
+BASE_URL = "https://hub.weirdhost.xyz"
+
+
+def make_login(tmp_path, monkeypatch, servers, **env):
+    monkeypatch.setenv('WEIRDHOST_SERVER_URLS', servers)
+    monkeypatch.setenv('REMEMBER_WEB_COOKIE', 'cookie')
+    monkeypatch.setenv('WEIRDHOST_STATE_FILE', str(tmp_path / 'state.json'))
+    monkeypatch.setenv('WEIRDHOST_HISTORY_FILE', str(tmp_path / 'history.jsonl'))
+    monkeypatch.setenv('WEIRDHOST_SESSION_CACHE', str(tmp_path / 'session.json'))
+    monkeypatch.setenv('WEIRDHOST_METRICS_FILE', str(tmp_path / 'metrics.json'))
+    monkeypatch.setenv('WEIRDHOST_DIAGNOSTICS', 'off')
+    for name, value in env.items():
+        monkeypatch.setenv(name, value)
+    return WeirdhostLogin()
+
+
+@pytest.mark.parametrize('value, expected', [
+    ('abc123', f"{BASE_URL}/server/abc123"),
+    (' abc-123 ', f"{BASE_URL}/server/abc-123"),
+    (f"{BASE_URL}/server/abc123/", f"{BASE_URL}/server/abc123"),
+    (f"{BASE_URL}/server/abc123?tab=console#top", f"{BASE_URL}/server/abc123"),
+    ("HTTPS://Hub.Weirdhost.XYZ/server/abc123", f"{BASE_URL}/server/abc123"),
+])
+def test_normalize_server_url(value, expected):
+    assert normalize_server_url(value, BASE_URL) == expected
+
+
+@pytest.mark.parametrize('value', ['hub.weirdhost.xyz/server/abc123', 'ftp://hub.weirdhost.xyz/server/abc', 'https://', 'abc 123'])
+def test_normalize_rejects_invalid_urls(value):
+    assert normalize_server_url(value, BASE_URL) is None
+
+
+def test_servers_are_deduplicated_by_id(tmp_path, monkeypatch):
+    login = make_login(tmp_path, monkeypatch, f"abc123, {BASE_URL}/server/abc123/ ,,def456,not a url")
+    assert login.server_list == [f"{BASE_URL}/server/abc123", f"{BASE_URL}/server/def456"]
+    assert login.duplicate_servers == [f"{BASE_URL}/server/abc123/"]
+    assert login.invalid_servers == ['not a url']
+
+
+def test_valid_config_has_no_problems(tmp_path, monkeypatch):
+    assert config_problems([make_login(tmp_path, monkeypatch, 'abc123')]) == []
+    assert config_problems([make_login(tmp_path, monkeypatch, 'abc123', WEIRDHOST_DIAGNOSTICS='Trace')]) == []
+
+
+@pytest.mark.parametrize('servers, env, code', [
+    ('abc123', {'REMEMBER_WEB_COOKIE': ''}, EXIT_NO_AUTH),
+    ('', {}, EXIT_NO_SERVERS),
+    ('abc123,not a url', {}, EXIT_BAD_URL),
+    ('abc123', {'WEIRDHOST_CONCURRENCY': 'many'}, EXIT_BAD_VALUE),
+    ('abc123', {'WEIRDHOST_DAEMON_MAX_SLEEP': '1h'}, EXIT_BAD_VALUE),
+    ('abc123', {'WEIRDHOST_LOG_LEVEL': 'loud'}, EXIT_BAD_VALUE),
+    ('abc123', {'WEIRDHOST_DIAGNOSTICS': 'verbose'}, EXIT_BAD_VALUE),
+    ('abc123', {'WEIRDHOST_DIAG_MAX_MB': '50MB'}, EXIT_BAD_VALUE),
+    ('abc123', {'WEIRDHOST_DISCOVER': 'always'}, EXIT_BAD_VALUE),
+])
+def test_config_problem_exit_codes(tmp_path, monkeypatch, servers, env, code):
+    problems = config_problems([make_login(tmp_path, monkeypatch, servers, **env)])
+    assert [problem[0] for problem in problems] == [code]
+
+
+def test_missing_playwright_keeps_http_results(tmp_path, monkeypatch):
+    login = make_login(tmp_path, monkeypatch, 'viahttp,viabrowser')
+    login.force = True
+
+    async def renew_via_http(server_urls, cookies):
+        # 第二个服务器的 HTTP 结果未知，需要浏览器处理
+        return [ServerResult('viahttp', 'success'), None]
+    login.renew_via_http = renew_via_http
+    # 模拟未安装 Playwright：导入时抛出 ModuleNotFoundError
+    monkeypatch.setitem(sys.modules, 'playwright', None)
+
+    results = asyncio.run(login.renew_all())
+
+    assert [str(result) for result in results] == ['viahttp: success', 'viabrowser: error']
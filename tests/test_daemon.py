@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+"""
+常驻模式测试 - 用桩对象代替浏览器，检查每批续期后的状态保存
+"""
+
+import os
+import sys
+import time
+import asyncio
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from main import WeirdhostLogin, RenewState, ServerResult, server_id_from_url
+
+
+class StubDaemon(WeirdhostLogin):
+    """跳过浏览器和登录，处理服务器时像 find_renew_button 一样记录命中的策略"""
+
+    async def open_context(self, stack, session_state=None, browser_provider=None):
+        return object()
+
+    async def install_route_filter(self, context):
+        pass
+
+    async def create_page(self, context):
+        return object()
+
+    async def close_page(self, page):
+        pass
+
+    async def login(self, *args, **kwargs):
+        return True
+
+    async def probe_login(self, context, refresh=False):
+        return True
+
+    async def refresh_expiry(self, context, state, server_urls):
+        self.refreshed.append([server_id_from_url(url) for url in server_urls])
+        # 桩页面上的到期时间已进入续期窗口，常驻模式启动后立即处理
+        for url in server_urls:
+            state.update_expiry(server_id_from_url(url), time.time() + 60)
+
+    async def save_session_state(self, *args):
+        pass
+
+    async def process_servers(self, context, page, server_urls):
+        for url in server_urls:
+            self.renew_state.record_strategy(server_id_from_url(url), "text_exact")
+        return [ServerResult(server_id_from_url(url), "success") for url in server_urls]
+
+
+def test_daemon_batch_keeps_strategy_and_refreshes_expiry(tmp_path, monkeypatch):
+    state_file = tmp_path / 'state.json'
+    monkeypatch.setenv('WEIRDHOST_STATE_FILE', str(state_file))
+    monkeypatch.setenv('WEIRDHOST_HISTORY_FILE', str(tmp_path / 'history.jsonl'))
+    monkeypatch.setenv('WEIRDHOST_METRICS_FILE', str(tmp_path / 'metrics.json'))
+    monkeypatch.setenv('WEIRDHOST_SESSION_CACHE', str(tmp_path / 'session.json'))
+    monkeypatch.setenv('WEIRDHOST_SERVER_URLS', 'https://hub.weirdhost.xyz/server/abc123')
+    monkeypatch.setenv('REMEMBER_WEB_COOKIE', 'cookie')
+    login = StubDaemon()
+    login.refreshed = []
+    login.daemon_jitter = 0.0
+    login.daemon_max_sleep = 0.1
+
+    async def run():
+        try:
+            await asyncio.wait_for(login.run_daemon_async(), 0.5)
+        except asyncio.TimeoutError:
+            pass
+
+    asyncio.run(run())
+
+    saved = RenewState(str(state_file)).load()
+    assert saved.servers['abc123']['last_status'] == "success"
+    assert saved.preferred_strategy('abc123') == "text_exact"
+    assert saved.strategy_hits == {"text_exact": 1}
+    # 启动时补全一次到期时间，续期成功后再读取新的到期时间
+    assert login.refreshed == [['abc123'], ['abc123']]
+    assert saved.servers['abc123']['expires_at']
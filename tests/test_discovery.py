@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+"""
+自动发现测试 - 四种发现模式对服务器列表的影响，以及没有可用 cookie 时在浏览器登录后再发现服务器
+"""
+
+import os
+import sys
+import asyncio
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from main import WeirdhostLogin, ServerResult, server_id_from_url, config_problems
+
+SESSION_COOKIE = 'pterodactyl_session'
+
+
+class StubLogin(WeirdhostLogin):
+    """服务器列表接口只接受登录后的会话 cookie；浏览器部分用桩对象代替"""
+
+    discovered = ['b2', 'c3']
+
+    def fetch_server_ids(self, cookies):
+        self.fetch_calls.append(dict(cookies))
+        if SESSION_COOKIE not in cookies:
+            raise PermissionError("HTTP 302 -> /auth/login")
+        return list(self.discovered)
+
+    async def open_context(self, stack, session_state=None, browser_provider=None):
+        return object()
+
+    async def install_route_filter(self, context):
+        pass
+
+    async def create_page(self, context):
+        return object()
+
+    async def close_page(self, page):
+        pass
+
+    async def login(self, *args, **kwargs):
+        return True
+
+    async def context_cookies(self, context):
+        return {SESSION_COOKIE: 'logged-in'}
+
+    async def save_session_state(self, *args):
+        pass
+
+    async def process_servers(self, context, page, server_urls):
+        self.processed.extend(server_id_from_url(url) for url in server_urls)
+        return [ServerResult(server_id_from_url(url), "success") for url in server_urls]
+
+
+def make_login(tmp_path, monkeypatch, mode, servers='a1,b2', **env):
+    monkeypatch.setenv('WEIRDHOST_DISCOVER', mode)
+    monkeypatch.setenv('WEIRDHOST_SERVER_URLS', servers)
+    monkeypatch.setenv('REMEMBER_WEB_COOKIE', 'cookie')
+    monkeypatch.setenv('WEIRDHOST_DISCOVERY_CACHE', str(tmp_path / 'servers.json'))
+    monkeypatch.setenv('WEIRDHOST_STATE_FILE', str(tmp_path / 'state.json'))
+    monkeypatch.setenv('WEIRDHOST_HISTORY_FILE', str(tmp_path / 'history.jsonl'))
+    monkeypatch.setenv('WEIRDHOST_SESSION_CACHE', str(tmp_path / 'session.json'))
+    monkeypatch.setenv('WEIRDHOST_METRICS_FILE', str(tmp_path / 'metrics.json'))
+    monkeypatch.setenv('WEIRDHOST_DIAGNOSTICS', 'off')
+    for name, value in env.items():
+        monkeypatch.setenv(name, value)
+    login = StubLogin()
+    login.fetch_calls = []
+    login.processed = []
+    return login
+
+
+def server_ids(login):
+    return [server_id_from_url(url) for url in login.server_list]
+
+
+@pytest.mark.parametrize('mode, expected', [
+    ('off', ['a1', 'b2']),
+    ('merge', ['a1', 'b2', 'c3']),
+    ('filter', ['b2']),
+    ('replace', ['b2', 'c3']),
+])
+def test_discover_modes(tmp_path, monkeypatch, mode, expected):
+    login = make_login(tmp_path, monkeypatch, mode)
+    assert asyncio.run(login.discover_servers({SESSION_COOKIE: 'x'})) is True
+    assert server_ids(login) == expected
+    assert len(login.fetch_calls) == (0 if mode == 'off' else 1)
+
+
+def test_discovery_uses_cache(tmp_path, monkeypatch):
+    login = make_login(tmp_path, monkeypatch, 'replace')
+    asyncio.run(login.discover_servers({SESSION_COOKIE: 'x'}))
+
+    # 缓存未过期时不再请求接口，没有 cookie 也能使用
+    login = make_login(tmp_path, monkeypatch, 'replace')
+    assert asyncio.run(login.discover_servers({}, defer=True)) is True
+    assert server_ids(login) == ['b2', 'c3']
+    assert login.fetch_calls == []
+
+
+def test_rejected_cookie_defers_discovery(tmp_path, monkeypatch):
+    login = make_login(tmp_path, monkeypatch, 'merge')
+    assert asyncio.run(login.discover_servers({'remember_web': 'expired'}, defer=True)) is False
+    assert server_ids(login) == ['a1', 'b2']
+
+    # 不能推迟时沿用配置的服务器列表
+    assert asyncio.run(login.discover_servers({'remember_web': 'expired'})) is True
+    assert server_ids(login) == ['a1', 'b2']
+
+
+def test_email_only_replace_discovers_after_login(tmp_path, monkeypatch):
+    login = make_login(tmp_path, monkeypatch, 'replace', servers='', REMEMBER_WEB_COOKIE='', CI='true',
+                       WEIRDHOST_EMAIL='user@example.com', WEIRDHOST_PASSWORD='password')
+    assert config_problems([login]) == []
+
+    results = asyncio.run(login.renew_all())
+
+    assert [str(result) for result in results] == ['b2: success', 'c3: success']
+    assert login.processed == ['b2', 'c3']
+    assert login.fetch_calls == [{SESSION_COOKIE: 'logged-in'}]
+    assert login.renew_state.servers['c3']['last_status'] == 'success'
+
+
+def test_rejected_cookie_discovers_after_login(tmp_path, monkeypatch):
+    login = make_login(tmp_path, monkeypatch, 'filter', WEIRDHOST_HTTP_RENEW='false')
+    login.force = True
+
+    results = asyncio.run(login.renew_all())
+
+    # remember cookie 被接口拒绝，登录后用会话 cookie 重新发现
+    assert [str(result) for result in results] == ['b2: success']
+    assert len(login.fetch_calls) == 2
+    assert login.processed == ['b2']
@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+"""
+运行历史测试 - 增量汇总统计、最近结果窗口，以及汇总文件损坏时从 JSONL 重建
+"""
+
+import os
+import sys
+import json
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from main import RunHistory, ServerResult
+
+
+def run(run_at, *results):
+    return {'run_at': run_at, 'results': [result.to_dict() for result in results]}
+
+
+def test_summary_accumulates_per_server(tmp_path):
+    history = RunHistory(str(tmp_path / 'history.jsonl'))
+    history.append(run('t1', ServerResult('a', 'success', duration=2.0), ServerResult('b', 'error')))
+    history.append(run('t2', ServerResult('a', 'already_renewed', duration=1.0), ServerResult('b', 'skipped')))
+    summary = history.append(run('t3', ServerResult('a', 'success', duration=4.0), ServerResult('', 'no_auth')))
+
+    assert summary['runs'] == 3
+    assert summary['servers']['a'] == {
+        'runs': 3, 'ok': 3, 'renewed': 2, 'latency_total': 6.0,
+        'recent': ['success', 'already_renewed', 'success'], 'last_run': 't3',
+    }
+    # 跳过的服务器和没有ID的结果不计入统计
+    assert summary['servers']['b']['runs'] == 1
+    assert summary['servers']['b']['recent'] == ['error']
+    assert '' not in summary['servers']
+
+
+def test_recent_window_is_bounded(tmp_path):
+    history = RunHistory(str(tmp_path / 'history.jsonl'))
+    for i in range(RunHistory.RECENT_SIZE + 5):
+        summary = history.append(run(f"t{i}", ServerResult('a', 'error' if i % 2 else 'success', duration=1.0)))
+    assert len(summary['servers']['a']['recent']) == RunHistory.RECENT_SIZE
+    assert summary['servers']['a']['runs'] == RunHistory.RECENT_SIZE + 5
+
+
+def test_summary_is_rebuilt_from_history(tmp_path):
+    history = RunHistory(str(tmp_path / 'history.jsonl'))
+    history.append(run('t1', ServerResult('a', 'success', duration=1.5)))
+    expected = history.append(run('t2', ServerResult('a', 'timeout')))
+
+    # 汇总文件丢失或损坏，JSONL 中还有一行损坏的记录
+    with open(history.summary_path, 'w', encoding='utf-8') as f:
+        f.write('{broken')
+    with open(history.path, 'a', encoding='utf-8') as f:
+        f.write('not json\n')
+
+    assert history.load_summary() == json.loads(json.dumps(expected))
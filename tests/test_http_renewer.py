@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+"""
+HTTP 续期客户端测试 - 连接失效时的重试规则，用桩连接代替网络
+"""
+
+import os
+import sys
+import http.client
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from main import HttpRenewer
+
+
+class StubResponse:
+    status = 200
+    will_close = False
+
+    class headers:
+        @staticmethod
+        def get_all(name):
+            return []
+
+    def read(self):
+        return b'{}'
+
+    def getheader(self, name, default=''):
+        return default
+
+
+class StubConnection:
+    """fail 为 'send' 时发送失败，为 'response' 时请求已发出但读取响应失败"""
+
+    def __init__(self, log, fail=None):
+        self.log = log
+        self.fail = fail
+
+    def request(self, method, path, body=None, headers=None):
+        if self.fail == 'send':
+            raise ConnectionResetError("broken pipe")
+        self.log.append((method, path))
+
+    def getresponse(self):
+        if self.fail == 'response':
+            raise http.client.RemoteDisconnected("closed")
+        return StubResponse()
+
+    def close(self):
+        pass
+
+
+def make_renewer(sent, pooled_fail=None, fresh_fail=None):
+    renewer = HttpRenewer('https://hub.weirdhost.xyz', {})
+    renewer.connect = lambda: StubConnection(sent, fresh_fail)
+    if pooled_fail is not None:
+        renewer.pool.put(StubConnection(sent, pooled_fail))
+    return renewer
+
+
+def test_stale_pooled_connection_retries_get():
+    sent = []
+    assert make_renewer(sent, pooled_fail='response').request('GET', '/')[0] == 200
+    assert sent == [('GET', '/'), ('GET', '/')]
+
+
+def test_renew_post_is_not_resent_after_sending():
+    sent = []
+    with pytest.raises(http.client.RemoteDisconnected):
+        make_renewer(sent, pooled_fail='response').renew('/renew')
+    assert sent == [('POST', '/renew')]
+
+
+def test_renew_post_retries_when_pooled_connection_fails_before_sending():
+    sent = []
+    assert make_renewer(sent, pooled_fail='send').renew('/renew')[0] == 200
+    assert sent == [('POST', '/renew')]
+
+
+def test_fresh_connection_is_not_retried():
+    sent = []
+    with pytest.raises(http.client.RemoteDisconnected):
+        make_renewer(sent, fresh_fail='response').request('GET', '/')
+    assert sent == [('GET', '/')]
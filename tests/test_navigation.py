@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+"""
+process_server 的导航次数测试 - 用桩页面代替浏览器，不需要安装 Playwright
+
+每个服务器只允许一次 page.goto 和一次按钮点击，也不能再等待 networkidle 等额外的加载状态。
+"""
+
+import os
+import sys
+import json
+import asyncio
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from main import WeirdhostLogin
+
+
+class StubResponse:
+    status = 200
+    url = "https://hub.weirdhost.xyz/api/client/notfreeservers/abc123/renew"
+
+    class request:
+        method = "POST"
+
+    async def text(self):
+        return json.dumps({'success': True, 'message': '시간이 추가됨'})
+
+
+class StubButton:
+    def __init__(self, page):
+        self.page = page
+
+    async def is_enabled(self):
+        return True
+
+    async def click(self):
+        self.page.clicks += 1
+        self.page.clicked.set()
+
+
+class StubLocator:
+    def __init__(self, page):
+        self.first = StubButton(page)
+
+
+class StubHandle:
+    async def json_value(self):
+        return "text_exact"
+
+
+class StubPage:
+    """只实现 process_server 用到的页面接口，额外的加载等待记录在 extra_waits 中"""
+
+    def __init__(self):
+        self.url = "about:blank"
+        self.navigations = []
+        self.clicks = 0
+        self.extra_waits = []
+        self.clicked = asyncio.Event()
+
+    async def goto(self, url, wait_until=None):
+        self.navigations.append((url, wait_until))
+        self.url = url
+
+    async def wait_for_load_state(self, state=None, timeout=None):
+        self.extra_waits.append(state)
+
+    async def wait_for_selector(self, selector, timeout=None):
+        self.extra_waits.append(selector)
+
+    async def wait_for_function(self, script, arg=None, timeout=None):
+        if script == WeirdhostLogin.NOTICES_SCRIPT:
+            # 提示框一直不出现，结果由续期接口响应决定
+            await asyncio.sleep(timeout / 1000)
+            raise TimeoutError("no notice")
+        return StubHandle()
+
+    async def wait_for_event(self, event, predicate=None, timeout=None):
+        await self.clicked.wait()
+        response = StubResponse()
+        assert predicate(response)
+        return response
+
+    async def evaluate(self, script, arg=None):
+        if script == WeirdhostLogin.COLLECT_SCRIPT:
+            return {'notices': [], 'mutations': 0}
+        if script == WeirdhostLogin.EXPIRY_SCRIPT:
+            # 同一次页面加载上读到的是续期前的到期时间
+            return "2020-01-01 00:00:00"
+        return None
+
+    def locator(self, selector):
+        return StubLocator(self)
+
+
+def make_login(tmp_path, monkeypatch):
+    monkeypatch.setenv('WEIRDHOST_STATE_FILE', str(tmp_path / 'state.json'))
+    monkeypatch.setenv('WEIRDHOST_HISTORY_FILE', str(tmp_path / 'history.jsonl'))
+    monkeypatch.setenv('WEIRDHOST_RESULT_TIMEOUT', '2')
+    return WeirdhostLogin()
+
+
+def test_single_navigation_per_server(tmp_path, monkeypatch):
+    login = make_login(tmp_path, monkeypatch)
+    login.renew_state.load()
+
+    async def run():
+        results = []
+        pages = []
+        for server_id in ('abc123', 'def456'):
+            page = StubPage()
+            results.append(await login.process_server(page, f"https://hub.weirdhost.xyz/server/{server_id}"))
+            pages.append(page)
+        return results, pages
+
+    results, pages = asyncio.run(run())
+
+    assert results == ['success', 'success']
+    for page in pages:
+        assert len(page.navigations) == 1
+        assert page.navigations[0][1] == 'domcontentloaded'
+        assert page.clicks == 1
+        assert page.extra_waits == []
+
+    # 续期成功后不记录点击前页面上的到期时间
+    assert login.server_expiry == {}
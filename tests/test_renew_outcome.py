@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+"""
+续期结果判断测试 - match_result 的 JSON/状态码规则，以及 wait_for_renew_outcome 的等待顺序
+"""
+
+import os
+import sys
+import json
+import asyncio
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from main import WeirdhostLogin
+
+
+class StubResponse:
+    url = "https://hub.weirdhost.xyz/api/client/notfreeservers/abc123/renew"
+
+    class request:
+        method = "POST"
+
+    def __init__(self, status, body):
+        self.status = status
+        self.body = body
+
+    async def text(self):
+        return self.body
+
+
+class StubHandle:
+    def __init__(self, value):
+        self.value = value
+
+    async def json_value(self):
+        return self.value
+
+
+class StubButton:
+    def __init__(self, page):
+        self.page = page
+
+    async def click(self):
+        self.page.clicked.set()
+
+
+class StubPage:
+    """点击后先出现一条无法判断结果的提示，response_delay 秒后续期接口才返回"""
+
+    def __init__(self, response, response_delay, notices):
+        self.response = response
+        self.response_delay = response_delay
+        self.notices = notices
+        self.clicked = asyncio.Event()
+
+    async def evaluate(self, script, arg=None):
+        if script == WeirdhostLogin.COLLECT_SCRIPT:
+            return {'notices': self.notices, 'mutations': len(self.notices)}
+        return None
+
+    async def wait_for_event(self, event, predicate=None, timeout=None):
+        await self.clicked.wait()
+        await asyncio.sleep(self.response_delay)
+        assert predicate(self.response)
+        return self.response
+
+    async def wait_for_function(self, script, arg=None, timeout=None):
+        await self.clicked.wait()
+        if (arg or 0) < len(self.notices):
+            return StubHandle(self.notices)
+        await asyncio.sleep(timeout / 1000)
+        raise TimeoutError("no more notices")
+
+
+def make_login(tmp_path, monkeypatch):
+    monkeypatch.setenv('WEIRDHOST_STATE_FILE', str(tmp_path / 'state.json'))
+    monkeypatch.setenv('WEIRDHOST_HISTORY_FILE', str(tmp_path / 'history.jsonl'))
+    monkeypatch.setenv('WEIRDHOST_RESULT_TIMEOUT', '0.5')
+    monkeypatch.setenv('WEIRDHOST_FALLBACK_WAIT', '0')
+    return WeirdhostLogin()
+
+
+def outcome_for(login, response, response_delay=0.0, notices=()):
+    page = StubPage(response, response_delay, list(notices))
+    return asyncio.run(login.wait_for_renew_outcome(page, StubButton(page), 'abc123'))
+
+
+def test_success_key_is_not_evidence(tmp_path, monkeypatch):
+    login = make_login(tmp_path, monkeypatch)
+    assert login.match_result('{"success": false}') == (None, None)
+    assert login.match_result('{"success": false, "message": "cooldown"}', 200) == (None, None)
+    assert login.match_result('{"success": true}', 200)[0] == "success"
+    assert login.match_result(json.dumps({'message': '시간이 추가됨'}), 200)[0] == "success"
+
+
+def test_success_requires_2xx(tmp_path, monkeypatch):
+    login = make_login(tmp_path, monkeypatch)
+    assert login.match_result(json.dumps({'message': 'success'}), 422) == (None, None)
+    assert login.match_result(json.dumps({'errors': [{'detail': '이미 연장했습니다'}]}), 400)[0] == "already_renewed"
+
+
+def test_failed_response_is_not_success(tmp_path, monkeypatch):
+    login = make_login(tmp_path, monkeypatch)
+    outcome = outcome_for(login, StubResponse(400, json.dumps({'success': False, 'message': 'success'})))
+    assert outcome.status == "unknown_changed"
+    assert outcome.http_status == 400
+
+
+def test_unclassified_notice_keeps_waiting_for_response(tmp_path, monkeypatch):
+    login = make_login(tmp_path, monkeypatch)
+    response = StubResponse(200, json.dumps({'success': True, 'message': '시간이 추가됨'}))
+    outcome = outcome_for(login, response, response_delay=0.2, notices=['처리 중...'])
+    assert outcome.status == "success"
+    assert outcome.source == "response"
+
+
+def test_http_2xx_needs_evidence(tmp_path, monkeypatch):
+    login = make_login(tmp_path, monkeypatch)
+    assert login.classify_http_response(200, json.dumps({'success': False, 'message': 'cooldown'})) is None
+    assert login.classify_http_response(204, '') is None
+    assert login.classify_http_response(200, json.dumps({'success': True, 'message': '시간이 추가됨'})) == "success"
+    assert login.classify_http_response(400, json.dumps({'errors': [{'detail': '이미 연장했습니다'}]})) == "already_renewed"
+    assert login.classify_http_response(500, json.dumps({'message': 'success'})) is None
+
+
+@pytest.mark.parametrize('text, http_status', [
+    ('Renewal unsuccessful', None),
+    ('Time not added', None),
+    (json.dumps({'message': 'unsuccessful'}), 200),
+    (json.dumps({'success': True, 'message': 'unsuccessful'}), 200),
+    ('Renewal failed', None),
+    ("Couldn't add time", None),
+    ('성공하지 못했습니다', None),
+])
+def test_negated_success_is_not_success(tmp_path, monkeypatch, text, http_status):
+    login = make_login(tmp_path, monkeypatch)
+    assert login.match_result(text, http_status) == (None, None)
+
+
+@pytest.mark.parametrize('text', ['Renewal successful', 'Time has been added.', '연장 성공', '시간이 추가됨'])
+def test_plain_success_messages(tmp_path, monkeypatch, text):
+    login = make_login(tmp_path, monkeypatch)
+    assert login.match_result(text, 200)[0] == "success"
+
+
+def test_http_unsuccessful_message_is_not_renewed(tmp_path, monkeypatch):
+    login = make_login(tmp_path, monkeypatch)
+    assert login.classify_http_response(200, json.dumps({'message': 'unsuccessful'})) is None
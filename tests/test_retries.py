@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+"""
+重试与时间预算测试 - 退避时间、临时性失败重试，以及整次运行超时后保留已完成的结果
+"""
+
+import os
+import sys
+import time
+import asyncio
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from main import WeirdhostLogin
+
+
+class StubPage:
+    created = 0
+
+    def __init__(self):
+        StubPage.created += 1
+
+    def set_default_timeout(self, timeout):
+        pass
+
+    def on(self, event, handler):
+        pass
+
+    async def close(self):
+        pass
+
+
+class StubContext:
+    async def new_page(self):
+        return StubPage()
+
+
+class StubLogin(WeirdhostLogin):
+    """process_server 按服务器ID返回预设的结果序列，slow 一直不返回"""
+
+    def __init__(self, statuses):
+        super().__init__()
+        self.statuses = statuses
+        self.calls = {}
+
+    async def process_server(self, page, server_url):
+        server_id = server_url.rsplit('/', 1)[-1]
+        self.calls[server_id] = self.calls.get(server_id, 0) + 1
+        if server_id == 'slow':
+            await asyncio.sleep(60)
+        sequence = self.statuses[server_id]
+        return sequence[min(self.calls[server_id], len(sequence)) - 1]
+
+
+def make_login(tmp_path, monkeypatch, statuses, **env):
+    monkeypatch.setenv('WEIRDHOST_STATE_FILE', str(tmp_path / 'state.json'))
+    monkeypatch.setenv('WEIRDHOST_HISTORY_FILE', str(tmp_path / 'history.jsonl'))
+    monkeypatch.setenv('WEIRDHOST_DIAGNOSTICS', 'off')
+    monkeypatch.setenv('WEIRDHOST_RETRY_BACKOFF', '0.01')
+    for name, value in env.items():
+        monkeypatch.setenv(name, value)
+    return StubLogin(statuses)
+
+
+def test_retry_delay_is_capped_exponential_backoff(tmp_path, monkeypatch):
+    login = make_login(tmp_path, monkeypatch, {}, WEIRDHOST_RETRY_BACKOFF='2', WEIRDHOST_RETRY_BACKOFF_MAX='5')
+    for _ in range(50):
+        assert 1.0 <= login.retry_delay(0) <= 2.0
+        assert 2.0 <= login.retry_delay(1) <= 4.0
+        assert 2.5 <= login.retry_delay(5) <= 5.0
+
+
+def test_transient_failures_are_retried(tmp_path, monkeypatch):
+    login = make_login(tmp_path, monkeypatch, {
+        'flaky': ['click_error', 'success'],
+        'broken': ['error'],
+        'renewed': ['already_renewed'],
+        'missing': ['no_button_found'],
+    }, WEIRDHOST_MAX_RETRIES='2')
+    urls = [f"https://hub.weirdhost.xyz/server/{server_id}" for server_id in ('flaky', 'broken', 'renewed', 'missing')]
+
+    results = asyncio.run(login.process_servers(StubContext(), StubPage(), urls))
+
+    assert [(result.server_id, result.status, result.attempts) for result in results] == [
+        ('flaky', 'success', 2),
+        ('broken', 'error', 3),
+        ('renewed', 'already_renewed', 1),
+        ('missing', 'no_button_found', 1),
+    ]
+
+
+def test_server_budget_stops_a_hung_server(tmp_path, monkeypatch):
+    login = make_login(tmp_path, monkeypatch, {'ok': ['success']}, WEIRDHOST_SERVER_BUDGET='0.2')
+    urls = ["https://hub.weirdhost.xyz/server/slow", "https://hub.weirdhost.xyz/server/ok"]
+
+    results = asyncio.run(login.process_servers(StubContext(), StubPage(), urls))
+
+    assert [str(result) for result in results] == ['slow: timeout', 'ok: success']
+
+
+def test_run_budget_keeps_finished_results(tmp_path, monkeypatch):
+    login = make_login(tmp_path, monkeypatch, {'ok': ['success']})
+    urls = ["https://hub.weirdhost.xyz/server/ok", "https://hub.weirdhost.xyz/server/hung"]
+
+    async def launch_and_run(server_urls, *args):
+        # 第一个服务器完成后，浏览器在处理第二个服务器时卡住
+        await login.process_servers(StubContext(), StubPage(), server_urls[:1])
+        await asyncio.sleep(60)
+    login.launch_and_run = launch_and_run
+    login.run_deadline = time.monotonic() + 0.3
+
+    results = asyncio.run(login.run_browser(urls, True, False))
+
+    assert [str(result) for result in results] == ['ok: success', 'hung: budget_exceeded']
@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+"""
+请求拦截测试 - 持久化配置目录下不安装路由，改用启动参数
+"""
+
+import os
+import sys
+import asyncio
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from main import WeirdhostLogin
+
+
+class StubContext:
+    def __init__(self):
+        self.routes = []
+
+    def on(self, event, handler):
+        pass
+
+    async def route(self, pattern, handler):
+        self.routes.append(pattern)
+
+
+def install(monkeypatch, profile_dir):
+    monkeypatch.setenv('WEIRDHOST_PROFILE_DIR', profile_dir)
+    login = WeirdhostLogin()
+    context = StubContext()
+    asyncio.run(login.install_route_filter(context))
+    return login, context
+
+
+def test_route_filter_without_profile(monkeypatch):
+    login, context = install(monkeypatch, '')
+    assert context.routes == ["**/*"]
+
+
+def test_persistent_profile_keeps_http_cache(monkeypatch, tmp_path):
+    login, context = install(monkeypatch, str(tmp_path / 'profile'))
+    # 启用路由会禁用 HTTP 缓存
+    assert context.routes == []
+    args = login.profile_block_args()
+    assert '--blink-settings=imagesEnabled=false' in args
+    assert any(arg.startswith('--host-resolver-rules=') and 'MAP *.doubleclick.net ~NOTFOUND' in arg for arg in args)
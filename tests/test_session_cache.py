@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+"""
+会话缓存测试 - CI 中未设置密钥时不写明文会话，持久化配置目录不保留 cookies
+"""
+
+import os
+import sys
+import asyncio
+from types import SimpleNamespace
+from contextlib import AsyncExitStack
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import main
+from main import WeirdhostLogin
+
+
+class StubContext:
+    async def storage_state(self):
+        return {'cookies': [{'name': 'pterodactyl_session', 'value': 'secret', 'domain': 'hub.weirdhost.xyz'}]}
+
+
+def save_session(tmp_path, monkeypatch, ci, key):
+    cache = tmp_path / 'session.json'
+    monkeypatch.setenv('WEIRDHOST_SESSION_CACHE', str(cache))
+    monkeypatch.setenv('WEIRDHOST_SESSION_KEY', key)
+    monkeypatch.setenv('CI', ci)
+    login = WeirdhostLogin()
+    asyncio.run(login.save_session_state(StubContext()))
+    return cache
+
+
+def test_ci_without_key_does_not_write_plaintext(tmp_path, monkeypatch):
+    assert not save_session(tmp_path, monkeypatch, 'true', '').exists()
+
+
+def test_local_run_without_key_writes_cache(tmp_path, monkeypatch):
+    assert save_session(tmp_path, monkeypatch, '', '').exists()
+
+
+class StubPlaywright:
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        pass
+
+
+class StubProfileContext:
+    def __init__(self):
+        self.calls = []
+
+    async def clear_cookies(self):
+        self.calls.append('clear_cookies')
+
+    async def close(self):
+        self.calls.append('close')
+
+
+def open_profile(tmp_path, monkeypatch, ci):
+    monkeypatch.setenv('WEIRDHOST_PROFILE_DIR', str(tmp_path / 'profile'))
+    monkeypatch.setenv('CI', ci)
+    monkeypatch.setattr(main, 'playwright_api', lambda: SimpleNamespace(async_playwright=StubPlaywright))
+    login = WeirdhostLogin()
+    context = StubProfileContext()
+
+    async def launch(playwright):
+        return context
+    login.launch_persistent_context = launch
+
+    async def run():
+        async with AsyncExitStack() as stack:
+            assert await login.open_context(stack) is context
+
+    asyncio.run(run())
+    return context.calls
+
+
+def test_ci_profile_clears_cookies_before_closing(tmp_path, monkeypatch):
+    assert open_profile(tmp_path, monkeypatch, 'true') == ['clear_cookies', 'close']
+
+
+def test_local_profile_keeps_cookies(tmp_path, monkeypatch):
+    assert open_profile(tmp_path, monkeypatch, '') == ['close']
@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+"""
+分片测试 - 服务器按ID稳定分片、合并结果时恢复原顺序，以及缺失分片标记为 shard_missing
+"""
+
+import os
+import sys
+import argparse
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from main import WeirdhostLogin, ServerResult, shard_of, parse_shard, server_id_from_url, write_partial_file, merge_partials
+
+SERVER_IDS = [f"srv{i:02d}" for i in range(12)]
+
+
+def make_login(tmp_path, monkeypatch):
+    monkeypatch.setenv('WEIRDHOST_SERVER_URLS', ','.join(SERVER_IDS))
+    monkeypatch.setenv('WEIRDHOST_STATE_FILE', str(tmp_path / 'state.json'))
+    monkeypatch.setenv('WEIRDHOST_HISTORY_FILE', str(tmp_path / 'history.jsonl'))
+    monkeypatch.setenv('WEIRDHOST_SESSION_CACHE', str(tmp_path / 'session.json'))
+    monkeypatch.setenv('WEIRDHOST_METRICS_FILE', str(tmp_path / 'metrics.json'))
+    monkeypatch.setenv('WEIRDHOST_PARTIAL_DIR', str(tmp_path / 'partials'))
+    return WeirdhostLogin()
+
+
+def test_shards_partition_servers(tmp_path, monkeypatch):
+    shards = []
+    for index in range(3):
+        login = make_login(tmp_path, monkeypatch)
+        login.apply_shard(index, 3)
+        shards.append([server_id_from_url(url) for url in login.server_list])
+        # 分片文件路径互不冲突
+        assert 'shard%dof3' % index in login.state_file
+
+    assert sorted(server_id for shard in shards for server_id in shard) == SERVER_IDS
+    for index, shard in enumerate(shards):
+        assert all(shard_of(server_id, 3) == index for server_id in shard)
+
+
+def test_parse_shard():
+    assert parse_shard('1/4') == (1, 4)
+    for value in ('4/4', '-1/2', '1', 'a/b', '0/0'):
+        with pytest.raises(argparse.ArgumentTypeError):
+            parse_shard(value)
+
+
+def test_merge_restores_order_and_marks_missing_shards(tmp_path, monkeypatch):
+    missing = 1
+    for index in range(3):
+        if index == missing:
+            continue
+        login = make_login(tmp_path, monkeypatch)
+        login.apply_shard(index, 3)
+        # 分片内按相反顺序完成，合并后应恢复配置顺序
+        results = [ServerResult(server_id_from_url(url), 'success') for url in reversed(login.server_list)]
+        write_partial_file([(login, results)], (index, 3))
+
+    paths = sorted(str(path) for path in (tmp_path / 'partials').iterdir())
+    [(login, results)] = merge_partials(paths)
+
+    assert [result.server_id for result in results] == SERVER_IDS
+    for result in results:
+        expected = 'shard_missing' if shard_of(result.server_id, 3) == missing else 'success'
+        assert result.status == expected
+    assert any(result.status == 'shard_missing' for result in results)
+
+
+def test_merge_rejects_mismatched_shard_counts(tmp_path, monkeypatch):
+    for shard in ((0, 2), (1, 3)):
+        login = make_login(tmp_path, monkeypatch)
+        login.apply_shard(*shard)
+        write_partial_file([(login, [])], shard)
+
+    with pytest.raises(ValueError):
+        merge_partials(sorted(str(path) for path in (tmp_path / 'partials').iterdir()))